@@ -0,0 +1,85 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from features.storage.paths import get_user_data_dir
+from features.storage.records import RECORD_COLUMNS
+
+# Synthetic health records shaped like real CSV histories, including the
+# irregularities the loaders tolerate: legacy rows with only a "120/80"
+# string, malformed or empty blood pressure, and missing sugar or pulse.
+#   python -m benchmarks.generate --users 5 --years 10 --per-day 20 [--seed 0]
+# Files are written under data/ in the current directory.
+
+MALFORMED_BLOOD_PRESSURE = ['bad', '120-80', '/80', 'n/a', '']
+
+def generate_records(years, per_day, seed=0, legacy_fraction=0.3, malformed_fraction=0.02, missing_fraction=0.05,
+                     start='2015-01-01'):
+    # Page-shaped records (RECORD_COLUMNS) for one user, in date order
+    rng = np.random.default_rng(seed)
+    days = int(round(365 * years))
+    count = days * per_day
+
+    # per_day readings at jittered times inside each day
+    day_offsets = np.repeat(np.arange(days), per_day) * 86_400
+    slot = np.tile(np.arange(per_day), days) * (86_400 // per_day)
+    jitter = rng.integers(0, max(1, 86_400 // per_day), count)
+    dates = pd.Timestamp(start) + pd.to_timedelta(day_offsets + slot + jitter, unit='s')
+
+    systolic = np.clip(rng.normal(122, 14, count), 80, 200).round().astype('int64')
+    diastolic = np.clip(rng.normal(79, 9, count), 45, 120).round().astype('int64')
+    sugar = np.clip(rng.normal(115, 30, count), 50, 400).round()
+    pulse = np.clip(rng.normal(76, 11, count), 40, 160).round()
+
+    blood_pressure = pd.Series(systolic.astype(str), dtype=object) + '/' + diastolic.astype(str)
+    malformed = rng.random(count) < malformed_fraction
+    blood_pressure[malformed] = rng.choice(MALFORMED_BLOOD_PRESSURE, malformed.sum())
+    sugar[rng.random(count) < missing_fraction] = np.nan
+    pulse[rng.random(count) < missing_fraction] = np.nan
+
+    # Legacy rows (and malformed ones) carry no numeric systolic/diastolic
+    numeric_bp = ~malformed & (rng.random(count) >= legacy_fraction)
+    notes = np.where(rng.random(count) < 0.2, 'after exercise', '')
+
+    return pd.DataFrame({
+        'date': dates,
+        'blood_pressure': blood_pressure,
+        'sugar_level': sugar,
+        'pulse_rate': pulse,
+        'notes': notes,
+        'systolic': pd.Series(systolic).where(numeric_bp).astype('Int64'),
+        'diastolic': pd.Series(diastolic).where(numeric_bp).astype('Int64'),
+    })[RECORD_COLUMNS]
+
+def write_user_csv(username, df):
+    # Writes the records as the user's canonical CSV file
+    from features.storage.csv_backend import get_records_path
+
+    os.makedirs(get_user_data_dir(username), exist_ok=True)
+    df.to_csv(get_records_path(username), index=False, date_format='%Y-%m-%d %H:%M:%S')
+
+def generate_users(users, years, per_day, seed=0, prefix='user'):
+    # Writes users CSV histories and returns their usernames
+    usernames = []
+    for index in range(users):
+        username = f"{prefix}{index:03d}"
+        write_user_csv(username, generate_records(years, per_day, seed=seed + index))
+        usernames.append(username)
+    return usernames
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write synthetic health records under data/.")
+    parser.add_argument('--users', type=int, default=1, help="Number of users to generate")
+    parser.add_argument('--years', type=float, default=1, help="Years of history per user")
+    parser.add_argument('--per-day', type=int, default=4, help="Readings per day")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data")
+    parser.add_argument('--prefix', default='user', help="Username prefix")
+    args = parser.parse_args(argv)
+
+    usernames = generate_users(args.users, args.years, args.per_day, seed=args.seed, prefix=args.prefix)
+    print(f"Wrote {len(usernames)} users with {int(round(365 * args.years)) * args.per_day} records each")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# Cold-start benchmark: how long a fresh server process takes to draw the
+# login form, and to render each page for the first time after logging in.
+#   python -m benchmarks.startup [--repeat 5] [--pages Analytics Reports] [--output startup.json]
+# Every measurement runs in a new interpreter so no module is already imported.
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+BENCHMARK_USER = "benchmark"
+
+def _measure_login():
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=120).run()
+    if not any(text_input.label == 'Username' for text_input in at.text_input):
+        raise RuntimeError("The login form was not rendered")
+    return {'login_form_s': time.perf_counter() - STARTED}
+
+def _measure_page(page):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP_FILE, default_timeout=120)
+    at.session_state['authentication_status'] = True
+    at.session_state['username'] = BENCHMARK_USER
+    at.session_state['name'] = BENCHMARK_USER
+    at.run()
+    logged_in = time.perf_counter()
+    at.sidebar.radio[0].set_value(page).run()
+    if at.exception:
+        raise RuntimeError(f"{page} failed: {at.exception[0].value}")
+    finished = time.perf_counter()
+    return {'logged_in_s': logged_in - STARTED, 'first_page_s': finished - logged_in, 'total_s': finished - STARTED}
+
+def _run_worker(target):
+    command = [sys.executable, '-m', 'benchmarks.startup', '--worker', target]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main(argv=None):
+    from features.ui.ui import PAGES
+
+    parser = argparse.ArgumentParser(description="Measure cold-start time to the login form and to each page.")
+    parser.add_argument('--repeat', type=int, default=5, help="Fresh processes per measurement (the median is reported)")
+    parser.add_argument('--pages', nargs='+', choices=list(PAGES), default=list(PAGES), help="Pages to time after login")
+    parser.add_argument('--output', help="Also write the results to this JSON file")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = _measure_login() if args.worker == 'login' else _measure_page(args.worker)
+        print(json.dumps(result))
+        return
+
+    results = {}
+    for target in ['login'] + args.pages:
+        runs = [_run_worker(target) for _ in range(args.repeat)]
+        results[target] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        timings = ", ".join(f"{key} {value:.3f}" for key, value in results[target].items())
+        print(f"{target}: {timings}")
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'benchmark': 'startup', 'repeat': args.repeat, 'results': results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
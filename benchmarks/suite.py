@@ -0,0 +1,220 @@
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Times the hot paths on synthetic data and writes comparable JSON results:
+#   python -m benchmarks.suite --years 1 10 --per-day 1 20 --users 3 --output results.json
+#   python -m benchmarks.suite --compare results.json   # report changes against an earlier run
+# Each dataset is generated with a fixed seed into a temporary directory, so
+# runs with the same parameters measure the same records.
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The per-row recommendation wrapper is slow by design; it is timed on this
+# many rows and reported per row
+ROWWISE_SAMPLE_ROWS = 500
+
+# Records each user saves per timed run of the save benchmark, so its
+# rows_per_s is saves per second whatever the history length
+SAVE_SAMPLE_RECORDS = 50
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def _environment():
+    import fpdf
+    import numpy
+    import pandas
+    import plotly
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'plotly': plotly.__version__,
+        'fpdf2': fpdf.__version__,
+        'commit': _git_commit(),
+    }
+
+def _time(function, repeat, setup=None):
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+def _benchmarks(usernames):
+    # name -> (setup, function, rows) for one dataset
+    from features.recommendations.recommendations import generate_daily_recommendation, generate_daily_recommendations
+    from features.reports.reports import PDF, REPORT_COLUMNS
+    from features.storage.records import attach_notes
+    from features.storage.storage import (append_record, get_flags, get_rollups, get_trends, invalidate, load_data,
+                                          load_data_with_notes, rebuild_index, summarize_records)
+    from features.visualization.visualization import build_trend_figures
+
+    frames = {username: load_data(username) for username in usernames}
+    rows = sum(len(df) for df in frames.values())
+    sample = {username: df.head(ROWWISE_SAMPLE_ROWS) for username, df in frames.items()}
+
+    def invalidate_all():
+        for username in usernames:
+            invalidate(username)
+
+    def pdf_tables():
+        for username, df in frames.items():
+            report_df = attach_notes(df, load_data_with_notes(username)[1])[REPORT_COLUMNS[:-1]].assign(recommendation=generate_daily_recommendations(df))
+            pdf = PDF(username=username)
+            pdf.alias_nb_pages()
+            pdf.add_page(orientation='L')
+            pdf.add_dataframe_as_table(report_df)
+            pdf.output(io.BytesIO())
+
+    def current_indexes():
+        # Saves only extend indexes that are up to date
+        for username in usernames:
+            get_rollups(username)
+            get_flags(username)
+            get_trends(username)
+
+    # Each save is a minute after the user's latest record
+    latest = {username: df['date'].iloc[-1] for username, df in frames.items()}
+
+    def save_records():
+        for username in usernames:
+            for _ in range(SAVE_SAMPLE_RECORDS):
+                latest[username] += timedelta(minutes=1)
+                append_record(username, {'date': latest[username], 'blood_pressure': "128/84", 'systolic': 128, 'diastolic': 84,
+                                         'sugar_level': 110, 'pulse_rate': 72, 'notes': ""})
+
+    return {
+        'load_data_cold': (invalidate_all, lambda: [load_data(username) for username in usernames], rows),
+        'load_data_cached': (None, lambda: [load_data(username) for username in usernames], rows),
+        'analytics_rollup_rebuild': (None, lambda: [rebuild_index(username, 'rollups') for username in usernames], rows),
+        'analytics_statistics': (None, lambda: [summarize_records(username, 'month') for username in usernames], rows),
+        'visualization_figures': (None, lambda: [build_trend_figures(df) for df in frames.values()], rows),
+        'daily_recommendations': (None, lambda: [generate_daily_recommendations(df) for df in frames.values()], rows),
+        'daily_recommendation_rowwise': (None, lambda: [df.apply(generate_daily_recommendation, axis=1) for df in sample.values()],
+                                         sum(len(df) for df in sample.values())),
+        'pdf_table': (None, pdf_tables, rows),
+        # Last, as it adds records; its time should stay flat as the history grows
+        'save_record': (current_indexes, save_records, SAVE_SAMPLE_RECORDS * len(usernames)),
+    }
+
+def run_dataset(years, per_day, users, backend, repeat, selected):
+    from benchmarks.generate import generate_users
+    from features.storage.csv_backend import CsvBackend
+    from features.storage.migrate import migrate_user
+    from features.storage.storage import configure_storage
+
+    usernames = generate_users(users, years, per_day)
+    storage = configure_storage({'backend': backend})
+    if backend != 'csv':
+        for username in usernames:
+            migrate_user(username, CsvBackend(), storage)
+
+    dataset = f"{backend}-{years:g}y-{per_day}pd-{users}u"
+    results = []
+    for name, (setup, function, rows) in _benchmarks(usernames).items():
+        if selected and name not in selected:
+            continue
+        timings = _time(function, repeat, setup)
+        median = statistics.median(timings)
+        results.append({
+            'name': name,
+            'dataset': dataset,
+            'rows': rows,
+            'repeat': repeat,
+            'min_s': min(timings),
+            'median_s': median,
+            'mean_s': statistics.fmean(timings),
+            'rows_per_s': rows / median if median else None,
+        })
+        print(f"{dataset:<28} {name:<30} {rows:>9} rows  median {median:8.4f}s  min {min(timings):8.4f}s")
+    return results
+
+def compare(results, baseline_path):
+    with open(baseline_path) as file:
+        baseline = {(entry['name'], entry['dataset']): entry for entry in json.load(file)['results']}
+    print(f"\nCompared with {baseline_path} (median, >1.00x is slower):")
+    for entry in results:
+        previous = baseline.get((entry['name'], entry['dataset']))
+        if previous and previous['median_s']:
+            ratio = entry['median_s'] / previous['median_s']
+            print(f"{entry['dataset']:<28} {entry['name']:<30} {ratio:6.2f}x")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the record pipeline on synthetic data.")
+    parser.add_argument('--years', type=float, nargs='+', default=[1, 5], help="Years of history per user (one dataset per value)")
+    parser.add_argument('--per-day', type=int, nargs='+', default=[4], help="Readings per day (one dataset per value)")
+    parser.add_argument('--users', type=int, default=1, help="Users per dataset")
+    parser.add_argument('--backend', choices=['csv', 'parquet', 'sqlite'], default='csv', help="Storage backend under test")
+    parser.add_argument('--repeat', type=int, default=3, help="Timed runs per benchmark")
+    parser.add_argument('--only', nargs='+', help="Run only these benchmarks")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--compare', help="Earlier results file to compare against")
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        results = run_dataset(args.years[0], args.per_day[0], args.users, args.backend, args.repeat, args.only)
+        with open(args.worker, 'w') as file:
+            json.dump(results, file)
+        return
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline = os.path.abspath(args.compare) if args.compare else None
+    report = {
+        'benchmark': 'suite',
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'compare', 'worker')},
+        'results': [],
+    }
+
+    # Storage paths and caches are per process and relative to the working
+    # directory, so every dataset runs in a fresh process in its own scratch
+    # directory
+    for years in args.years:
+        for per_day in args.per_day:
+            workdir = tempfile.mkdtemp(prefix='phr-benchmark-')
+            results_path = os.path.join(workdir, 'results.json')
+            command = [sys.executable, '-m', 'benchmarks.suite', '--worker', results_path,
+                       '--years', str(years), '--per-day', str(per_day), '--users', str(args.users),
+                       '--backend', args.backend, '--repeat', str(args.repeat)]
+            if args.only:
+                command += ['--only', *args.only]
+            environment = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])))
+            try:
+                subprocess.run(command, cwd=workdir, env=environment, check=True)
+                with open(results_path) as file:
+                    report['results'].extend(json.load(file))
+            finally:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w') as file:
+            json.dump(report, file, indent=2)
+        print(f"\nResults written to {output}")
+    if baseline:
+        compare(report['results'], baseline)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import plotly.express as px
+import streamlit as st
+
+from features.cohort.summaries import RECENT_DAYS, WORSENING_RISE, average_distribution, cohort_overview, cohort_summaries, worsening_patients
+from features.telemetry.telemetry import span
+from features.ui.ui import is_admin
+
+# Average readings offered in the distribution chart: column -> (label, bin width)
+AVERAGE_METRICS = {
+    'sugar_level': ("Sugar Level (mg/dL)", 10),
+    'systolic': ("Systolic BP (mmHg)", 5),
+    'diastolic': ("Diastolic BP (mmHg)", 5),
+    'pulse_rate': ("Pulse Rate (bpm)", 5),
+}
+
+# Longest patient lists sent to the browser
+MAX_LISTED_PATIENTS = 200
+
+@st.fragment
+def render_average_distribution(summaries):
+    # Switching the metric reruns only the chart, not the cohort scan
+    metric = st.selectbox("Average of", list(AVERAGE_METRICS), format_func=lambda metric: AVERAGE_METRICS[metric][0],
+                          key="cohort_distribution_metric")
+    label, bin_width = AVERAGE_METRICS[metric]
+    distribution = average_distribution(summaries, metric, bin_width)
+    if distribution.empty:
+        st.info("No readings recorded for this metric.")
+        return
+    fig = px.bar(distribution, x='average', y='patients', labels={'average': label, 'patients': "Patients"},
+                 title=f"Patients by Average {label}")
+    st.plotly_chart(fig, use_container_width=True)
+
+def render_cohort_analytics():
+    st.header("Cohort Analytics")
+    if not is_admin():
+        st.error("This page is only available to administrators.")
+        return
+
+    progress_bar = st.progress(0.0, text="Summarizing patients...")
+    with span("cohort.scan") as timing:
+        summaries = cohort_summaries(progress=lambda fraction: progress_bar.progress(fraction, text="Summarizing patients..."))
+        timing.rows = len(summaries)
+    progress_bar.empty()
+
+    failed = summaries[summaries['error'].notna()]
+    summaries = summaries[summaries['error'].isna()]
+    if not failed.empty:
+        st.warning(f"{len(failed)} patients could not be summarized: {', '.join(failed['username'].head(10))}")
+    if summaries.empty:
+        st.info("No patient records found.")
+        return
+
+    overview = cohort_overview(summaries)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Patients", overview['patients'])
+    col2.metric("Active This Week", overview['active_week'])
+    col3.metric("High BP This Week", overview['high_bp_week'])
+    col4.metric("Trending Worse", overview['worsening'])
+
+    st.subheader("Distribution of Average Readings")
+    render_average_distribution(summaries)
+
+    st.subheader("Patients Trending Worse")
+    st.caption(f"Average over the last {RECENT_DAYS} days compared with the {RECENT_DAYS} days before: "
+               f"systolic up by {WORSENING_RISE['systolic']} mmHg or more, or sugar up by {WORSENING_RISE['sugar_level']} mg/dL or more.")
+    worse = worsening_patients(summaries)
+    if worse.empty:
+        st.info("No patients are trending worse.")
+    else:
+        st.dataframe(worse.head(MAX_LISTED_PATIENTS), hide_index=True)
+
+    st.subheader("High Blood Pressure This Week")
+    high_bp = summaries[summaries['high_bp_week'] > 0].sort_values('high_bp_week', ascending=False)
+    if high_bp.empty:
+        st.info("No high blood pressure readings this week.")
+    else:
+        st.dataframe(high_bp[['username', 'high_bp_week', 'records_week', 'last_day']].head(MAX_LISTED_PATIENTS), hide_index=True)
@@ -0,0 +1,179 @@
+import bisect
+import math
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from features.storage import rollups
+from features.storage.flags import TIMESTAMP_FORMAT
+from features.storage.paths import list_usernames
+from features.storage.storage import configure_storage, get_data_version, get_flags, get_rollups, get_storage_options
+from features.thresholds.thresholds import HEALTHY_RANGES, configure_thresholds, high_threshold, thresholds_tag
+
+# Population views over every user under data/. Each patient is reduced to
+# one summary row built from their rollups and flag index, never from their
+# raw records. Summaries are cached per process on the patient's data
+# version, so a repeat view only recomputes patients who saved since; a large
+# set of stale patients is spread over worker processes.
+
+# Length of the "recent" window, compared with the window just before it
+RECENT_DAYS = 30
+
+# A patient is trending worse when a recent average rose at least this much
+WORSENING_RISE = {'systolic': 5, 'sugar_level': 10}
+
+# Stale patients are summarized in worker processes in chunks of this many;
+# up to INLINE_SCAN_USERS are summarized in this process, which is quicker
+# than starting the workers
+SCAN_CHUNK_USERS = 250
+INLINE_SCAN_USERS = 500
+COHORT_WORKERS = os.cpu_count()
+
+SUMMARY_COLUMNS = (
+    ['username', 'records', 'last_day', 'records_week', 'high_bp_week']
+    + [f"{metric}_mean" for metric in rollups.METRICS]
+    + [f"recent_{metric}" for metric in rollups.METRICS]
+    + [f"previous_{metric}" for metric in rollups.METRICS]
+    + ['error']
+)
+
+_summaries = {}
+_summaries_lock = threading.Lock()
+
+_executor = None
+_executor_args = None
+_executor_lock = threading.Lock()
+
+def _high_bp_readings(flag_index, since):
+    # Flagged readings from `since` on whose blood pressure is above the high threshold
+    entries = flag_index['records']
+    first = bisect.bisect_left(entries, since.strftime(TIMESTAMP_FORMAT), key=lambda entry: entry[0])
+    systolic_high, diastolic_high = high_threshold('systolic'), high_threshold('diastolic')
+    return sum(
+        1 for _, _, _, _, systolic, diastolic in entries[first:]
+        if (systolic is not None and systolic > systolic_high) or (diastolic is not None and diastolic > diastolic_high)
+    )
+
+def _mean(summary, metric):
+    return summary[metric]['mean'] if metric in summary else math.nan
+
+def summarize_patient(username, today):
+    # One patient's summary row as of `today`. Day and week rollup keys are
+    # ISO dates, so the windows are plain key ranges.
+    patient_rollups = get_rollups(username)
+    week_start = today - timedelta(days=today.weekday())
+    recent_start = today - timedelta(days=RECENT_DAYS - 1)
+    previous_start = recent_start - timedelta(days=RECENT_DAYS)
+
+    overall = rollups.summarize(patient_rollups, 'month')
+    recent = rollups.summarize(patient_rollups, 'day', recent_start.isoformat(), today.isoformat())
+    previous = rollups.summarize(patient_rollups, 'day', previous_start.isoformat(), (recent_start - timedelta(days=1)).isoformat())
+
+    summary = {
+        'username': username,
+        'records': overall['records'],
+        'last_day': max(patient_rollups['day'], default=None),
+        'records_week': patient_rollups['week'].get(week_start.isoformat(), {'records': 0})['records'],
+        'high_bp_week': _high_bp_readings(get_flags(username), datetime.combine(week_start, datetime.min.time())),
+    }
+    for metric in rollups.METRICS:
+        summary[f"{metric}_mean"] = _mean(overall, metric)
+        summary[f"recent_{metric}"] = _mean(recent, metric)
+        summary[f"previous_{metric}"] = _mean(previous, metric)
+    return summary
+
+def _summarize_chunk(usernames, today):
+    # Runs in a worker process. One unreadable store shouldn't hide the
+    # rest of the cohort, so failures come back as rows with an error.
+    summaries = []
+    for username in usernames:
+        try:
+            summaries.append(summarize_patient(username, today))
+        except Exception as e:
+            summaries.append({'username': username, 'error': str(e)})
+    return summaries
+
+def _init_worker(storage_options, healthy_ranges):
+    configure_storage(storage_options)
+    configure_thresholds(healthy_ranges)
+
+def _get_executor():
+    # Workers are started once and reused; they are replaced if the storage
+    # settings or healthy ranges have changed since
+    global _executor, _executor_args
+    args = (get_storage_options(), {metric: dict(ranges) for metric, ranges in HEALTHY_RANGES.items()})
+    with _executor_lock:
+        if _executor is None or _executor_args != args:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # The Streamlit server is multi-threaded, so workers are spawned rather than forked
+            _executor = ProcessPoolExecutor(max_workers=COHORT_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=args)
+            _executor_args = args
+        return _executor
+
+def _summarize(usernames, today, progress=None):
+    if len(usernames) <= INLINE_SCAN_USERS:
+        yield from _summarize_chunk(usernames, today)
+        return
+    chunks = [usernames[offset:offset + SCAN_CHUNK_USERS] for offset in range(0, len(usernames), SCAN_CHUNK_USERS)]
+    executor = _get_executor()
+    futures = [executor.submit(_summarize_chunk, chunk, today) for chunk in chunks]
+    for done, future in enumerate(as_completed(futures), start=1):
+        yield from future.result()
+        if progress is not None:
+            progress(done / len(futures))
+
+def cohort_summaries(usernames=None, today=None, progress=None):
+    # One summary row per patient (every user under data/ by default).
+    # progress, if given, is called with the fraction of stale patients done.
+    usernames = list_usernames() if usernames is None else list(usernames)
+    today = today or date.today()
+    ranges_tag = thresholds_tag()
+    tags = {username: (get_data_version(username), ranges_tag, today) for username in usernames}
+
+    with _summaries_lock:
+        rows = {}
+        for username in usernames:
+            entry = _summaries.get(username)
+            if entry is not None and entry[0] == tags[username]:
+                rows[username] = entry[1]
+
+    stale = [username for username in usernames if username not in rows]
+    for summary in _summarize(stale, today, progress):
+        username = summary['username']
+        rows[username] = summary
+        if 'error' not in summary:
+            with _summaries_lock:
+                _summaries[username] = (tags[username], summary)
+
+    return pd.DataFrame([rows[username] for username in usernames], columns=SUMMARY_COLUMNS)
+
+def worsening_patients(summaries, rises=None):
+    # Patients whose recent average rose by at least the given amount on any
+    # metric, worst systolic rise first, with the change per metric
+    rises = rises or WORSENING_RISE
+    changes = pd.DataFrame({
+        f"{metric}_change": summaries[f"recent_{metric}"] - summaries[f"previous_{metric}"] for metric in rises
+    })
+    worse = pd.concat([changes[f"{metric}_change"] >= rise for metric, rise in rises.items()], axis=1).any(axis=1)
+    result = pd.concat([summaries[['username', 'last_day']], changes], axis=1)[worse]
+    return result.sort_values(list(changes.columns), ascending=False)
+
+def average_distribution(summaries, metric, bin_width):
+    # Patients per bin of their all-time average for metric, as (bin start, patients)
+    averages = summaries[f"{metric}_mean"].dropna()
+    bins = (averages // bin_width * bin_width).astype('int64')
+    return bins.groupby(bins).size().rename('patients').rename_axis('average').reset_index()
+
+def cohort_overview(summaries):
+    return {
+        'patients': len(summaries),
+        'active_week': int((summaries['records_week'] > 0).sum()),
+        'high_bp_week': int((summaries['high_bp_week'] > 0).sum()),
+        'worsening': len(worsening_patients(summaries)),
+    }
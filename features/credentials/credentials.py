@@ -0,0 +1,225 @@
+import json
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+from streamlit_authenticator.utilities.exceptions import RegisterError
+from streamlit_authenticator.utilities.hasher import Hasher
+
+from features.storage.paths import DATA_DIR
+from features.storage.pool import ConnectionPool
+
+# User accounts for streamlit-authenticator, kept in SQLite instead of
+# config.yaml so a signup is one indexed insert however many users exist,
+# and concurrent signups can't overwrite each other.
+DEFAULT_CREDENTIALS_PATH = os.path.join(DATA_DIR, "credentials.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    email TEXT UNIQUE,
+    data TEXT NOT NULL, -- JSON of the remaining fields (password hash, names, roles, ...)
+    version INTEGER NOT NULL DEFAULT 0 -- bumped on every change, so cached entries can be checked
+);
+"""
+
+# Session state stauth keeps on the user entry; it is never persisted so a
+# restart never leaves anyone logged in
+TRANSIENT_FIELDS = {'logged_in'}
+
+MAX_CACHED_USERS = 1024
+
+_REMOVED = object()
+
+class UserEntry(dict):
+    # One user's fields; changes made by stauth are written through to the
+    # store one field at a time
+
+    def __init__(self, store, username, fields, version=0):
+        super().__init__(fields)
+        self._store = store
+        self._username = username
+        self._version = version
+
+    def _refresh(self, fields, version):
+        # Takes the stored fields, keeping this process's transient ones
+        transient = {key: value for key, value in self.items() if key in TRANSIENT_FIELDS}
+        dict.clear(self)
+        dict.update(self, fields)
+        dict.update(self, transient)
+        self._version = version
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if key not in TRANSIENT_FIELDS:
+            self._store._update(self, key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if key not in TRANSIENT_FIELDS:
+            self._store._update(self, key)
+
+class CredentialStore(MutableMapping):
+    # Stands in for credentials['usernames']. Lookups hit the primary key;
+    # entries are kept per process so stauth's session fields survive between
+    # lookups, and are refreshed whenever the row's version has moved on, so
+    # changes made by other processes are seen on the next lookup. Assigning
+    # a username registers a new user and fails if the username or email is
+    # already taken.
+
+    def __init__(self, path=DEFAULT_CREDENTIALS_PATH, pool_size=4):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.pool = ConnectionPool(path, SCHEMA, size=pool_size)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._add_version_column()
+
+    def _add_version_column(self):
+        # Stores created before rows were versioned
+        with self.pool.connection() as connection:
+            columns = {row[1] for row in connection.execute("PRAGMA table_info(users)")}
+            if 'version' in columns:
+                return
+            try:
+                with connection:
+                    connection.execute("ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                # Another process added it first
+                pass
+
+    def _remember(self, username, entry):
+        with self._cache_lock:
+            self._cache[username] = entry
+            self._cache.move_to_end(username)
+            while len(self._cache) > MAX_CACHED_USERS:
+                self._cache.popitem(last=False)
+
+    def __getitem__(self, username):
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT data, version FROM users WHERE username = ?", (username,)).fetchone()
+        with self._cache_lock:
+            entry = self._cache.get(username)
+            if row is None:
+                self._cache.pop(username, None)
+        if row is None:
+            raise KeyError(username)
+        if entry is None:
+            entry = UserEntry(self, username, json.loads(row[0]), row[1])
+            self._remember(username, entry)
+        elif entry._version != row[1]:
+            entry._refresh(json.loads(row[0]), row[1])
+        return entry
+
+    def __contains__(self, username):
+        try:
+            self[username]
+        except KeyError:
+            return False
+        return True
+
+    def __setitem__(self, username, fields):
+        self._insert([(username, fields)])
+        self._remember(username, UserEntry(self, username, fields))
+
+    def __delitem__(self, username):
+        with self.pool.connection() as connection:
+            with connection:
+                deleted = connection.execute("DELETE FROM users WHERE username = ?", (username,)).rowcount
+        with self._cache_lock:
+            self._cache.pop(username, None)
+        if not deleted:
+            raise KeyError(username)
+
+    def __iter__(self):
+        with self.pool.connection() as connection:
+            usernames = [row[0] for row in connection.execute("SELECT username FROM users ORDER BY username")]
+        return iter(usernames)
+
+    def __len__(self):
+        with self.pool.connection() as connection:
+            return connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+    def _row(self, username, fields):
+        persisted = {key: value for key, value in fields.items() if key not in TRANSIENT_FIELDS}
+        return username, persisted.get('email'), json.dumps(persisted)
+
+    def _insert(self, users, ignore_existing=False):
+        rows = [self._row(username, fields) for username, fields in users]
+        conflict = " OR IGNORE" if ignore_existing else ""
+        try:
+            with self.pool.connection() as connection:
+                with connection:
+                    connection.executemany(f"INSERT{conflict} INTO users (username, email, data) VALUES (?, ?, ?)", rows)
+        except sqlite3.IntegrityError:
+            raise RegisterError("Username or email already taken")
+
+    def _update(self, entry, key, value=_REMOVED):
+        # Writes only the changed field, so changes other processes made to
+        # the user's other fields are kept, then refreshes the entry
+        path = f'$."{key}"'
+        if value is _REMOVED:
+            assignments, params = ["data = json_remove(data, ?)"], [path]
+        else:
+            assignments, params = ["data = json_set(data, ?, json(?))"], [path, json.dumps(value)]
+        if key == 'email':
+            assignments.append("email = ?")
+            params.append(None if value is _REMOVED else value)
+        with self.pool.connection() as connection:
+            with connection:
+                connection.execute(f"UPDATE users SET {', '.join(assignments)}, version = version + 1 WHERE username = ?",
+                                   params + [entry._username])
+                row = connection.execute("SELECT data, version FROM users WHERE username = ?", (entry._username,)).fetchone()
+        if row is not None:
+            entry._refresh(json.loads(row[0]), row[1])
+
+    def import_users(self, users):
+        # Copies accounts from a config.yaml credentials section, keeping any
+        # that already exist in the store. Plain-text passwords are hashed, as
+        # stauth's auto_hash would have done.
+        imported = []
+        for username, fields in (users or {}).items():
+            fields = dict(fields)
+            if 'password' in fields and not Hasher.is_hash(fields['password']):
+                fields['password'] = Hasher.hash(fields['password'])
+            imported.append((username.lower(), fields))
+        self._insert(imported, ignore_existing=True)
+
+    def contains_value(self, value):
+        # Replacement for stauth's scan of every user when checking that a new
+        # email is unused
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT 1 FROM users WHERE email = ? OR username = ? LIMIT 1", (value, value)).fetchone()
+        return row is not None
+
+    def find_username(self, key, value):
+        # Replacement for stauth's scan of every user when looking one up by email
+        if key != 'email':
+            return next((username for username, fields in self.items() if fields.get(key) == value), False)
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT username FROM users WHERE email = ?", (value,)).fetchone()
+        return row[0] if row else False
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_credential_store(config_users=None, options=None):
+    # The process-wide store, created on first use. Accounts still listed in
+    # config.yaml are copied in once so existing logins keep working.
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = CredentialStore(**(options or {}))
+            _store.import_users(config_users)
+        return _store
+
+def use_credential_store(authenticator, store):
+    # stauth.Authenticate copies credentials['usernames'] into a plain dict
+    # when it is created, so it is created with no users and the store is
+    # swapped into its model afterwards, together with indexed versions of the
+    # two lookups that would otherwise scan every user.
+    model = authenticator.authentication_controller.authentication_model
+    model.credentials = {'usernames': store}
+    model._credentials_contains_value = store.contains_value
+    model._get_username = store.find_username
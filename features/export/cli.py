@@ -0,0 +1,59 @@
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+import yaml
+from yaml.loader import SafeLoader
+
+from features.export.export import EXPORT_FORMATS, write_export
+from features.storage.storage import configure_storage
+
+# Export of a user's raw records from the command line:
+#   python -m features.export.cli --user alice --format fhir [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--output PATH]
+# Records stream from the store to the file in chunks; use --output - to
+# write to standard output.
+
+# Write buffer for the output file
+OUTPUT_BUFFER_BYTES = 1 << 20
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a user's health records as CSV, JSON Lines or a FHIR R4 Bundle.")
+    parser.add_argument('--user', required=True, help="User whose records are exported")
+    parser.add_argument('--format', choices=list(EXPORT_FORMATS), default='csv', help="Export format")
+    parser.add_argument('--start', type=date.fromisoformat, help="First day to export (default: the first record)")
+    parser.add_argument('--end', type=date.fromisoformat, help="Last day to export (default: the latest record)")
+    parser.add_argument('--output', help="File to write, or - for standard output (default: <user>_health_records.<ext>)")
+    parser.add_argument('--config', default="config.yaml", help="App config providing the storage settings")
+    args = parser.parse_args(argv)
+
+    if args.start and args.end and args.start > args.end:
+        parser.error("--start must not be after --end")
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config) as file:
+            config = yaml.load(file, Loader=SafeLoader) or {}
+    configure_storage(config.get('storage'))
+
+    output = args.output or f"{args.user}_health_records.{EXPORT_FORMATS[args.format][1]}"
+    started = time.perf_counter()
+    if output == '-':
+        rows = write_export(args.user, args.format, sys.stdout, args.start, args.end)
+        sys.stdout.flush()
+    else:
+        with open(output, 'w', encoding='utf-8', newline='', buffering=OUTPUT_BUFFER_BYTES) as output_file:
+            rows = write_export(args.user, args.format, output_file, args.start, args.end)
+
+    elapsed = time.perf_counter() - started
+    # Progress goes to stderr so it never mixes with an export on stdout
+    if not rows:
+        print(f"No records of {args.user} in the selected dates; nothing was exported to {output}", file=sys.stderr)
+    else:
+        print(f"Exported {rows} records of {args.user} as {EXPORT_FORMATS[args.format][0]} to {output} in {elapsed:.1f}s",
+              file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,208 @@
+import io
+import itertools
+import json
+import tempfile
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from features.storage.records import RECORD_COLUMNS, VITAL_COLUMNS
+from features.storage.storage import iter_records
+from features.telemetry.telemetry import span
+
+# Raw record exports for users and their doctors. Records stream from the
+# store in chunks through a format writer that yields text pieces, which go
+# straight to the output, so memory use doesn't grow with the history.
+#   csv    the app's record columns, readable by the bulk importer
+#   jsonl  one record object per line
+#   fhir   one FHIR R4 collection Bundle with blood pressure, heart rate
+#          and glucose Observations for each record
+EXPORT_CHUNK_ROWS = 5000
+
+# format -> (label, file extension, MIME type)
+EXPORT_FORMATS = {
+    'csv': ("CSV", 'csv', 'text/csv'),
+    'jsonl': ("JSON Lines", 'jsonl', 'application/x-ndjson'),
+    'fhir': ("FHIR R4 Bundle", 'json', 'application/fhir+json'),
+}
+
+CSV_DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+JSON_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+LOINC_SYSTEM = "http://loinc.org"
+UCUM_SYSTEM = "http://unitsofmeasure.org"
+
+FHIR_CATEGORIES = {
+    'vital-signs': "Vital Signs",
+    'laboratory': "Laboratory",
+}
+
+# Observations written per record. Blood pressure is one panel with a
+# component per reading, column -> (LOINC code, display, UCUM unit); the
+# others are column -> (LOINC code, display, UCUM unit, category).
+FHIR_BLOOD_PRESSURE = ("85354-9", "Blood pressure panel with all children optional")
+FHIR_COMPONENTS = {
+    'systolic': ("8480-6", "Systolic blood pressure", "mm[Hg]"),
+    'diastolic': ("8462-4", "Diastolic blood pressure", "mm[Hg]"),
+}
+FHIR_OBSERVATIONS = {
+    'pulse_rate': ("8867-4", "Heart rate", "/min", 'vital-signs'),
+    'sugar_level': ("2339-0", "Glucose [Mass/volume] in Blood", "mg/dL", 'laboratory'),
+}
+
+# Bundle entries handed to the output at a time
+FHIR_BATCH_ENTRIES = 200
+
+# Observation ids are derived from the user, time and code, so exporting
+# the same records again gives the same ids
+FHIR_ID_NAMESPACE = uuid.UUID('6f1c1f2e-4d1b-5b8e-9a57-3f6c2d0c9e41')
+
+def _plain_records(chunk):
+    # The chunk in plain dtypes: whole-number readings as nullable integers
+    # (so they print without decimals), text columns as objects
+    df = pd.DataFrame({'date': chunk['date']})
+    for column in RECORD_COLUMNS[1:]:
+        if column in VITAL_COLUMNS:
+            values = pd.to_numeric(chunk[column], errors='coerce').astype('float64')
+            present = values.dropna()
+            df[column] = values.astype('Int64') if (present == present.round()).all() else values
+        else:
+            df[column] = chunk[column].astype(object).where(chunk[column].notna(), None)
+    return df
+
+def _csv_pieces(username, chunks):
+    header = True
+    for chunk in chunks:
+        df = _plain_records(chunk)
+        df['date'] = df['date'].dt.strftime(CSV_DATE_FORMAT)
+        yield df.to_csv(index=False, header=header, lineterminator='\n')
+        header = False
+    if header:
+        yield ",".join(RECORD_COLUMNS) + "\n"
+
+def _jsonl_pieces(username, chunks):
+    for chunk in chunks:
+        df = _plain_records(chunk)
+        df['date'] = df['date'].dt.strftime(JSON_DATE_FORMAT)
+        # pandas escapes every "/" (as in "120/80"); the plain form is equally valid JSON
+        text = df.to_json(orient='records', lines=True, force_ascii=False).replace("\\/", "/")
+        yield text if text.endswith("\n") else text + "\n"
+
+def _values(series):
+    # Plain Python values with None for missing readings
+    return series.astype(object).where(series.notna(), None).tolist()
+
+def _members(value):
+    # JSON of a dict's members without the braces, for splicing into a template
+    return json.dumps(value, ensure_ascii=False)[1:-1]
+
+def _coding(code, display):
+    return {'coding': [{'system': LOINC_SYSTEM, 'code': code, 'display': display}], 'text': display}
+
+def _fixed_members(code, display, category):
+    # The members every Observation of this kind shares
+    return _members({
+        'resourceType': "Observation",
+        'status': "final",
+        'category': [{'coding': [{'system': "http://terminology.hl7.org/CodeSystem/observation-category",
+                                  'code': category, 'display': FHIR_CATEGORIES[category]}]}],
+        'code': _coding(code, display),
+    })
+
+def _unit_members(unit):
+    return _members({'unit': unit, 'system': UCUM_SYSTEM, 'code': unit})
+
+# Most of each Observation is the same for every reading of a kind, so those
+# members are encoded once and the readings are spliced in; encoding whole
+# resources with json.dumps took most of the export time
+_BLOOD_PRESSURE_MEMBERS = _fixed_members(*FHIR_BLOOD_PRESSURE, 'vital-signs')
+_COMPONENT_MEMBERS = {
+    column: (json.dumps(_coding(code, display)), _unit_members(unit))
+    for column, (code, display, unit) in FHIR_COMPONENTS.items()
+}
+_OBSERVATION_MEMBERS = {
+    column: (code, _fixed_members(code, display, category), _unit_members(unit))
+    for column, (code, display, unit, category) in FHIR_OBSERVATIONS.items()
+}
+
+def _entry(username, subject, effective, code, fixed_members, value_member, note_member):
+    observation_id = uuid.uuid5(FHIR_ID_NAMESPACE, f"{username}/{effective}/{code}")
+    return (f'{{"fullUrl": "urn:uuid:{observation_id}", "resource": {{{fixed_members}, "id": "{observation_id}", '
+            f'"subject": {subject}, "effectiveDateTime": "{effective}", {value_member}{note_member}}}}}')
+
+def _fhir_entries(username, df):
+    # Bundle entries for one chunk of records. Timestamps are stored without
+    # a zone and are taken as local time on the machine doing the export.
+    subject = json.dumps({'reference': f"Patient/{username}"}, ensure_ascii=False)
+    columns = {column: _values(df[column]) for column in [*FHIR_COMPONENTS, *FHIR_OBSERVATIONS, 'notes']}
+    for row, timestamp in enumerate(df['date']):
+        effective = timestamp.to_pydatetime().astimezone().isoformat()
+        note = columns['notes'][row]
+        note_member = f', "note": [{{"text": {json.dumps(note, ensure_ascii=False)}}}]' if note else ""
+        components = [
+            f'{{"code": {coding}, "valueQuantity": {{"value": {json.dumps(columns[column][row])}, {unit_members}}}}}'
+            for column, (coding, unit_members) in _COMPONENT_MEMBERS.items() if columns[column][row] is not None
+        ]
+        if components:
+            yield _entry(username, subject, effective, FHIR_BLOOD_PRESSURE[0], _BLOOD_PRESSURE_MEMBERS,
+                         f'"component": [{", ".join(components)}]', note_member)
+        for column, (code, fixed_members, unit_members) in _OBSERVATION_MEMBERS.items():
+            value = columns[column][row]
+            if value is not None:
+                yield _entry(username, subject, effective, code, fixed_members,
+                             f'"valueQuantity": {{"value": {json.dumps(value)}, {unit_members}}}', note_member)
+
+def _fhir_pieces(username, chunks):
+    # The bundle is written as its opening, the entries and its closing, so
+    # it never has to be held whole
+    bundle = {
+        'resourceType': "Bundle",
+        'id': str(uuid.uuid4()),
+        'type': "collection",
+        'timestamp': datetime.now().astimezone().isoformat(timespec='seconds'),
+    }
+    yield "{" + _members(bundle) + ', "entry": ['
+    separator = "\n"
+    for chunk in chunks:
+        entries = _fhir_entries(username, _plain_records(chunk))
+        # A chunk's entries are several megabytes of text, so they are
+        # handed on in small batches rather than joined
+        while batch := list(itertools.islice(entries, FHIR_BATCH_ENTRIES)):
+            yield separator + ",\n".join(batch)
+            separator = ",\n"
+    yield "\n]}\n"
+
+EXPORT_WRITERS = {
+    'csv': _csv_pieces,
+    'jsonl': _jsonl_pieces,
+    'fhir': _fhir_pieces,
+}
+
+def write_export(username, export_format, output, start_date=None, end_date=None, chunk_size=EXPORT_CHUNK_ROWS):
+    # Writes the export to the text stream output; returns the number of records
+    rows = 0
+
+    def chunks():
+        nonlocal rows
+        for chunk in iter_records(username, start_date, end_date, chunk_size):
+            rows += len(chunk)
+            yield chunk
+
+    with span(f"export.{export_format}") as timing:
+        for piece in EXPORT_WRITERS[export_format](username, chunks()):
+            output.write(piece)
+        timing.rows = rows
+    return rows
+
+def export_to_file(username, export_format, start_date=None, end_date=None):
+    # The export in an unnamed temporary file, rewound for reading, for the
+    # Reports page's download button. The file is returned unbuffered, one of
+    # the file types st.download_button accepts.
+    export_file = tempfile.TemporaryFile(buffering=0)
+    text = io.TextIOWrapper(io.BufferedWriter(export_file), encoding='utf-8', newline='')
+    write_export(username, export_format, text, start_date, end_date)
+    text.flush()
+    text.detach().detach()
+    export_file.seek(0)
+    return export_file
@@ -0,0 +1,48 @@
+import argparse
+import os
+import time
+
+import yaml
+from yaml.loader import SafeLoader
+
+from features.importer.importer import import_records, read_export
+from features.storage.storage import configure_storage
+from features.thresholds.thresholds import configure_thresholds
+
+# Bulk import of device exports from the command line:
+#   python -m features.importer.cli --user alice export.csv [more.json ...]
+# Each file is validated and written in one batch; readings whose timestamp
+# is already recorded are skipped, so re-running an import is harmless.
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import health readings from CSV/JSON device exports.")
+    parser.add_argument('--user', required=True, help="User the readings belong to")
+    parser.add_argument('files', nargs='+', help="Export files (.csv, .json or .jsonl)")
+    parser.add_argument('--config', default="config.yaml", help="App config providing the storage settings and healthy ranges")
+    args = parser.parse_args(argv)
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config) as file:
+            config = yaml.load(file, Loader=SafeLoader) or {}
+    configure_storage(config.get('storage'))
+    configure_thresholds(config.get('healthy_ranges'))
+
+    failed = False
+    for path in args.files:
+        started = time.perf_counter()
+        try:
+            df = read_export(path, path)
+        except (OSError, ValueError) as e:
+            print(f"{path}: skipped ({e})")
+            failed = True
+            continue
+        imported, duplicates, rejected = import_records(args.user, df)
+        print(f"{path}: imported {imported} records, {duplicates} duplicates skipped, "
+              f"{len(rejected)} rows rejected in {time.perf_counter() - started:.1f}s")
+        for reason, count in rejected['reason'].value_counts().items():
+            print(f"  {count} x {reason}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
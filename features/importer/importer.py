@@ -0,0 +1,164 @@
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from features.storage.locks import user_lock
+from features.storage.paths import get_user_data_dir
+from features.storage.records import RECORD_COLUMNS, backfill_blood_pressure
+from features.storage.storage import append_records, load_data
+from features.telemetry.telemetry import span
+
+# Bulk import of CSV/JSON exports from BP cuffs and glucose meters. Rows are
+# validated and deduplicated with column operations and the accepted batch
+# is written to storage at once.
+
+# Export column names (lowercased) mapped to record columns
+COLUMN_ALIASES = {
+    'date': 'date', 'timestamp': 'date', 'datetime': 'date', 'time': 'date', 'measured_at': 'date',
+    'blood_pressure': 'blood_pressure', 'bp': 'blood_pressure',
+    'systolic': 'systolic', 'sys': 'systolic',
+    'diastolic': 'diastolic', 'dia': 'diastolic',
+    'sugar_level': 'sugar_level', 'sugar': 'sugar_level', 'glucose': 'sugar_level',
+    'pulse_rate': 'pulse_rate', 'pulse': 'pulse_rate', 'heart_rate': 'pulse_rate',
+    'notes': 'notes', 'note': 'notes', 'comment': 'notes',
+}
+
+# Plausible readings; the form uses the same limits for blood pressure
+VALID_RANGES = {
+    'systolic': (0, 300),
+    'diastolic': (0, 200),
+    'sugar_level': (0, 1000),
+    'pulse_rate': (0, 300),
+}
+
+IMPORT_FORMATS = ['csv', 'json', 'jsonl']
+
+# Numeric timestamps are Unix epoch times: from 1e9 (2001) in seconds, and
+# from 1e11 in milliseconds. Smaller numbers such as 20240131 are read as text.
+EPOCH_SECONDS_MIN = 1e9
+EPOCH_MILLIS_MIN = 1e11
+
+# Earlier timestamps are rejected as implausible
+EARLIEST_TIMESTAMP = datetime(1900, 1, 1)
+
+def read_export(source, file_name):
+    # Reads an export into a frame with record column names. source is a path
+    # or a file object; file_name decides the format by its extension.
+    file_format = os.path.splitext(file_name)[1].lower().lstrip('.')
+    if file_format == 'csv':
+        df = pd.read_csv(source, dtype=str, keep_default_na=False)
+    elif file_format in ('json', 'jsonl', 'ndjson'):
+        # Dates are left as they are for validate_records to parse
+        df = pd.read_json(source, lines=file_format != 'json', dtype=False, convert_dates=False)
+    else:
+        raise ValueError(f"Unsupported file type '{file_name}'. Use one of: {', '.join(IMPORT_FORMATS)}")
+
+    df = df.rename(columns=lambda column: COLUMN_ALIASES.get(str(column).strip().lower(), column))
+    if 'date' not in df:
+        raise ValueError("The export has no date or timestamp column.")
+    if not any(column in df for column in ['blood_pressure', 'systolic', 'sugar_level', 'pulse_rate']):
+        raise ValueError("The export has no blood pressure, sugar or pulse columns.")
+    for column in RECORD_COLUMNS:
+        if column not in df:
+            df[column] = np.nan
+    return df[RECORD_COLUMNS]
+
+def _whole_numbers(values):
+    # Whole-number readings are stored without a decimal point, like form entries
+    if (values.dropna() % 1 == 0).all():
+        return values.round().astype('Int64')
+    return values
+
+def parse_dates(raw):
+    # Timestamps with an offset and epoch times are converted to UTC; naive
+    # ones are kept as they are. Epoch times past what a timestamp can hold
+    # are left invalid.
+    raw = raw.replace('', np.nan)
+    numbers = pd.to_numeric(raw, errors='coerce')
+    latest = pd.Timestamp.max.timestamp()
+    seconds = (numbers >= EPOCH_SECONDS_MIN) & (numbers < min(EPOCH_MILLIS_MIN, latest))
+    millis = (numbers >= EPOCH_MILLIS_MIN) & (numbers < latest * 1000)
+    dates = pd.to_datetime(raw.mask(numbers >= EPOCH_SECONDS_MIN), errors='coerce', format='mixed', utc=True).dt.tz_localize(None)
+    dates = dates.mask(seconds, pd.to_datetime(numbers.where(seconds), unit='s', errors='coerce'))
+    return dates.mask(millis, pd.to_datetime(numbers.where(millis), unit='ms', errors='coerce'))
+
+def validate_records(df):
+    # Splits raw export rows into (records, rejected). Each rejected row
+    # carries the first problem found in a 'reason' column.
+    dates = parse_dates(df['date'])
+    blank = df.replace('', np.nan)
+    systolic, diastolic = backfill_blood_pressure(blank)
+    values = {
+        'systolic': systolic,
+        'diastolic': diastolic,
+        'sugar_level': pd.to_numeric(blank['sugar_level'], errors='coerce'),
+        'pulse_rate': pd.to_numeric(blank['pulse_rate'], errors='coerce'),
+    }
+
+    # Checks in priority order; np.select picks the first that fails
+    conditions = [dates.isna(), dates > datetime.now(), dates < EARLIEST_TIMESTAMP]
+    reasons = ["invalid timestamp", "timestamp in the future", f"timestamp before {EARLIEST_TIMESTAMP.year}"]
+    for metric, (low, high) in VALID_RANGES.items():
+        provided = blank[metric].notna()
+        if metric in ('systolic', 'diastolic'):
+            provided |= blank['blood_pressure'].notna()
+        conditions.append(provided & values[metric].isna())
+        reasons.append(f"{metric} is not a number")
+        conditions.append((values[metric] < low) | (values[metric] > high))
+        reasons.append(f"{metric} out of range")
+    conditions.append(pd.concat(values, axis=1).isna().all(axis=1))
+    reasons.append("no readings")
+    reason = pd.Series(np.select(conditions, reasons, default=''), index=df.index)
+
+    valid = reason == ''
+    rejected = df[~valid].assign(reason=reason[~valid])
+    systolic = _whole_numbers(values['systolic'][valid])
+    diastolic = _whole_numbers(values['diastolic'][valid])
+    has_bp = systolic.notna() & diastolic.notna()
+    records = pd.DataFrame({
+        'date': dates[valid],
+        'blood_pressure': (systolic.astype(str) + '/' + diastolic.astype(str)).where(has_bp),
+        'sugar_level': _whole_numbers(values['sugar_level'][valid]),
+        'pulse_rate': _whole_numbers(values['pulse_rate'][valid]),
+        'notes': blank['notes'][valid].fillna('').astype(str),
+        'systolic': systolic,
+        'diastolic': diastolic,
+    })
+    return records, rejected
+
+def import_records(username, df):
+    # Validates an export, drops readings whose timestamp is already stored
+    # (or repeated in the export) and writes the rest in one batch.
+    # Returns (imported, duplicates, rejected rows).
+    with span("importer.validate", rows=len(df)):
+        records, rejected = validate_records(df)
+    with user_lock(get_user_data_dir(username)):
+        existing = load_data(username)
+        duplicate = records['date'].duplicated()
+        if not existing.empty:
+            duplicate |= records['date'].isin(existing['date'])
+        records = records[~duplicate].sort_values('date', kind='stable')
+        if not records.empty:
+            with span("importer.write", rows=len(records)):
+                append_records(username, records)
+    return len(records), int(duplicate.sum()), rejected
+
+def render_bulk_import():
+    st.subheader("Bulk Import")
+    st.write("Import historical readings exported from a blood pressure cuff or glucose meter. "
+             "Readings with a timestamp that is already recorded are skipped.")
+    uploaded_file = st.file_uploader("Export file (CSV or JSON)", type=IMPORT_FORMATS, key="bulk_import_file")
+    if uploaded_file is not None and st.button("Import Records", key="bulk_import_button"):
+        try:
+            df = read_export(uploaded_file, uploaded_file.name)
+        except ValueError as e:
+            st.error(f"Could not read the export: {e}")
+            return
+        imported, duplicates, rejected = import_records(st.session_state["username"], df)
+        st.success(f"Imported {imported} records ({duplicates} duplicates skipped, {len(rejected)} rows rejected).")
+        if not rejected.empty:
+            st.write("Rejected rows:")
+            st.dataframe(rejected.head(100))
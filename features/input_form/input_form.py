@@ -1,7 +1,8 @@
 import streamlit as st
-import pandas as pd
 from datetime import datetime
-import os
+from features.importer.importer import render_bulk_import
+from features.storage.storage import append_record
+from features.telemetry.telemetry import span
 
 def render_input_form():
     st.header("Daily Health Data Entry")
@@ -32,32 +33,21 @@ def render_input_form():
             else:
                 blood_pressure_combined = f"{systolic_bp}/{diastolic_bp}"
                 new_record = {
-                    "date": [entry_datetime],
-                    "blood_pressure": [blood_pressure_combined],
-                    "sugar_level": [sugar_level],
-                    "pulse_rate": [pulse_rate],
-                    "notes": [notes]
+                    "date": entry_datetime,
+                    "blood_pressure": blood_pressure_combined,
+                    "systolic": systolic_bp,
+                    "diastolic": diastolic_bp,
+                    "sugar_level": sugar_level,
+                    "pulse_rate": pulse_rate,
+                    "notes": notes
                 }
-                new_df = pd.DataFrame(new_record)
 
                 # Get the current username from session state
                 username = st.session_state["username"]
-                
-                # Construct user-specific file path
-                user_data_dir = os.path.join("data", username)
-                file_path = os.path.join(user_data_dir, "health_records.csv")
-                
-                # Ensure the user-specific directory exists
-                os.makedirs(user_data_dir, exist_ok=True)
-                
-                if os.path.exists(file_path):
-                    try:
-                        existing_df = pd.read_csv(file_path)
-                        updated_df = pd.concat([existing_df, new_df], ignore_index=True)
-                    except pd.errors.EmptyDataError:
-                        updated_df = new_df
-                else:
-                    updated_df = new_df
-                
-                updated_df.to_csv(file_path, index=False)
+
+                # Append to the user's record log instead of rewriting the whole file
+                with span("input_form.save", rows=1):
+                    append_record(username, new_record)
                 st.success("Health record saved successfully!")
+
+    render_bulk_import()
@@ -1,110 +1,107 @@
 import streamlit as st
 import pandas as pd
-import os
-from datetime import datetime, timedelta
-import re
+import numpy as np
+from features.storage.records import slice_dates
+from features.storage.storage import get_date_bounds, get_trends, load_last_readings, summarize_records
+from features.storage.trends import MIN_BASELINE_READINGS, MIN_STD, ROLLING_WINDOW, anomaly_frame, current_trends
+from features.telemetry.telemetry import span
+from features.thresholds.thresholds import high_threshold, low_threshold
+from datetime import timedelta
 
-def load_data():
-    # Get the current username from session state
-    username = st.session_state["username"]
-    
-    # Construct user-specific file path
-    user_data_dir = os.path.join("data", username)
-    file_path = os.path.join(user_data_dir, "health_records.csv")
-    
-    # Ensure the user-specific directory exists (though input_form should create it)
-    os.makedirs(user_data_dir, exist_ok=True)
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        try:
-            df = pd.read_csv(file_path)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df.dropna(subset=['date'], inplace=True) # Drop rows where date could not be parsed
-            df = df.sort_values(by='date')
-            return df
-        except pd.errors.EmptyDataError:
-            return pd.DataFrame()
-    else:
-        pd.DataFrame(columns=['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes']).to_csv(file_path, index=False)
-        return pd.DataFrame()
+ALL_HEALTHY_MESSAGE = "All recorded metrics are within the healthy range. Keep it up!"
+
+# Single-value rules evaluated by generate_daily_recommendations: (label, column, unit)
+METRIC_RULES = [
+    ("Sugar", 'sugar_level', "mg/dL"),
+    ("Pulse", 'pulse_rate', "bpm"),
+]
+
+# Metrics described by the trend summary: column -> (label, unit)
+TREND_LABELS = {
+    'systolic': ("Systolic BP", "mmHg"),
+    'diastolic': ("Diastolic BP", "mmHg"),
+    'sugar_level': ("Sugar", "mg/dL"),
+    'pulse_rate': ("Pulse", "bpm"),
+}
+
+# A rolling mean this many baseline standard deviations away from the
+# baseline counts as rising or falling
+TREND_SHIFT = 0.5
+
+# Most unusual readings listed on the page
+MAX_LISTED_ANOMALIES = 10
 
-def get_recent_data(df, days=30):
+def _format_whole(values):
+    # Vectorized equivalent of f"{value:.0f}" for the non-missing values
+    return pd.Series(np.round(values.fillna(0).to_numpy(dtype='float64')).astype('int64').astype(str), index=values.index)
+
+def _rate(label, value_text, is_high, is_low):
+    status = pd.Series(np.select([is_high, is_low], ["high", "low"], default="healthy"), index=value_text.index)
+    return label + " (" + value_text + ") is " + status + "."
+
+def generate_daily_recommendations(df):
+    # Evaluates every threshold rule as column operations and returns the
+    # per-row recommendation text, matching generate_daily_recommendation
     if df.empty:
-        return pd.DataFrame()
-    latest_date = df['date'].max()
-    start_date = latest_date - timedelta(days=days)
-    return df[df['date'] >= start_date]
+        return pd.Series(dtype=object, index=df.index)
+
+    flagged = pd.Series(False, index=df.index)
+    parts = []
 
-def generate_daily_recommendation(row):
-    recs = []
-    
     # Blood Pressure
-    bp = row['blood_pressure']
-    if isinstance(bp, str):
-        match = re.match(r'(\d+)/(\d+)', bp)
-        if match:
-            systolic, diastolic = int(match.group(1)), int(match.group(2))
-            bp_val = f"{systolic}/{diastolic} mmHg"
-            if systolic > 130 or diastolic > 85:
-                recs.append(f"BP ({bp_val}) is high.")
-            elif systolic < 90 or diastolic < 60:
-                recs.append(f"BP ({bp_val}) is low.")
-            else:
-                recs.append(f"BP ({bp_val}) is healthy.")
-        else:
-            recs.append("BP data format invalid.")
+    systolic = pd.to_numeric(df['systolic'], errors='coerce')
+    diastolic = pd.to_numeric(df['diastolic'], errors='coerce')
+    has_bp = systolic.notna() & diastolic.notna()
+    bp_high = has_bp & ((systolic > high_threshold('systolic')) | (diastolic > high_threshold('diastolic')))
+    bp_low = has_bp & ~bp_high & ((systolic < low_threshold('systolic')) | (diastolic < low_threshold('diastolic')))
+    bp_val = _format_whole(systolic) + "/" + _format_whole(diastolic) + " mmHg"
+    # A BP string that could not be split into numbers is reported as invalid;
+    # any other value counts as missing (a categorical column from load_data
+    # is judged by its categories)
+    bp_column = df['blood_pressure']
+    if isinstance(bp_column.dtype, pd.CategoricalDtype):
+        text_categories = np.array([isinstance(category, str) for category in bp_column.cat.categories] + [False])
+        has_bp_text = pd.Series(text_categories[bp_column.cat.codes.to_numpy()], index=df.index)
     else:
-        recs.append("BP data missing.")
-    
-    # Sugar Level
-    sugar = row['sugar_level']
-    if pd.notna(sugar):
-        sugar_val = f"{sugar:.0f} mg/dL"
-        if sugar > 140:
-            recs.append(f"Sugar ({sugar_val}) is high.")
-        elif sugar < 70:
-            recs.append(f"Sugar ({sugar_val}) is low.")
-        else:
-            recs.append(f"Sugar ({sugar_val}) is healthy.")
-    else:
-        recs.append("Sugar data missing.")
-
-    # Pulse Rate
-    pulse = row['pulse_rate']
-    if pd.notna(pulse):
-        pulse_val = f"{pulse:.0f} bpm"
-        if pulse > 100:
-            recs.append(f"Pulse ({pulse_val}) is high.")
-        elif pulse < 60:
-            recs.append(f"Pulse ({pulse_val}) is low.")
-        else:
-            recs.append(f"Pulse ({pulse_val}) is healthy.")
-    else:
-        recs.append("Pulse data missing.")
+        has_bp_text = bp_column.map(lambda value: isinstance(value, str)).astype(bool)
+    bp_invalid = ~has_bp & has_bp_text
+    bp_text = _rate("BP", bp_val, bp_high, bp_low)
+    bp_text = bp_text.where(has_bp, np.where(bp_invalid, "BP data format invalid.", "BP data missing."))
+    parts.append(bp_text)
+    flagged |= bp_high | bp_low
 
-    if all("healthy" in rec.lower() for rec in recs if "data missing" not in rec.lower() and "data format invalid" not in rec.lower()):
-        return "All recorded metrics are within the healthy range. Keep it up!"
-    
-    return " ".join(recs)
+    for label, column, unit in METRIC_RULES:
+        values = pd.to_numeric(df[column], errors='coerce')
+        present = values.notna()
+        is_high = present & (values > high_threshold(column))
+        is_low = present & ~is_high & (values < low_threshold(column))
+        text = _rate(label, _format_whole(values) + " " + unit, is_high, is_low)
+        parts.append(text.where(present, f"{label} data missing."))
+        flagged |= is_high | is_low
 
-def generate_recommendations_text(df):
-    if df.empty:
+    combined = parts[0].str.cat(parts[1:], sep=" ")
+    return combined.where(flagged, ALL_HEALTHY_MESSAGE)
+
+def generate_daily_recommendation(row):
+    # Recommendation text for a single record; see generate_daily_recommendations
+    return generate_daily_recommendations(pd.DataFrame([row])).iloc[0]
+
+def generate_recommendations_text(summary):
+    # summary holds per-metric statistics as returned by summarize_records
+    if not summary.get('records'):
         return ["Not enough recent data to generate specific recommendations."]
 
     # For overall summary, we still use averages
     recommendations = []
-    df['blood_pressure'] = df['blood_pressure'].astype(str)
-    bp_split = df['blood_pressure'].str.extract(r'(\d+)/(\d+)', expand=True)
-    df['systolic'] = pd.to_numeric(bp_split[0], errors='coerce')
-    df['diastolic'] = pd.to_numeric(bp_split[1], errors='coerce')
 
     # Blood Pressure Recommendations
-    if not df['systolic'].dropna().empty:
-        avg_systolic = df['systolic'].mean()
-        avg_diastolic = df['diastolic'].mean()
+    if 'systolic' in summary:
+        avg_systolic = summary['systolic']['mean']
+        avg_diastolic = summary.get('diastolic', {}).get('mean', float('nan'))
         bp_rec = f"Avg BP ({avg_systolic:.0f}/{avg_diastolic:.0f}): "
-        if avg_systolic > 130 or avg_diastolic > 85:
+        if avg_systolic > high_threshold('systolic') or avg_diastolic > high_threshold('diastolic'):
             bp_rec += "Elevated. Consider reducing sodium and consulting your doctor."
-        elif avg_systolic < 90 or avg_diastolic < 60:
+        elif avg_systolic < low_threshold('systolic') or avg_diastolic < low_threshold('diastolic'):
             bp_rec += "Low. Ensure hydration and discuss with your doctor if symptomatic."
         else:
             bp_rec += "Healthy range."
@@ -113,19 +110,49 @@ def generate_recommendations_text(df):
     # Other metrics can be added here if needed for summary
     return recommendations
 
+def generate_trend_text(current):
+    # current holds per-metric trend state as returned by current_trends
+    lines = []
+    for metric, (label, unit) in TREND_LABELS.items():
+        trend = current.get(metric)
+        if trend is None or trend['count'] < MIN_BASELINE_READINGS:
+            continue
+        shift = trend['rolling_mean'] - trend['ewma']
+        if abs(shift) < TREND_SHIFT * max(trend['std'], MIN_STD):
+            direction = "steady"
+        else:
+            direction = "rising" if shift > 0 else "falling"
+        lines.append(f"{label}: your last {ROLLING_WINDOW} readings average {trend['rolling_mean']:.0f} {unit} "
+                     f"against your usual {trend['ewma']:.0f} {unit} ({direction}).")
+    return lines
+
+def generate_anomaly_text(anomalies):
+    # anomalies is a frame from anomaly_frame; latest first
+    lines = []
+    for date, metric, value, _, baseline in anomalies.iloc[::-1].itertuples(index=False, name=None):
+        label, unit = TREND_LABELS[metric]
+        direction = "high" if value > baseline else "low"
+        lines.append(f"{date.strftime('%Y-%m-%d %H:%M')}: {label} {value:.0f} {unit} is unusually {direction} for you "
+                     f"(usual {baseline:.0f} {unit}).")
+    return lines
+
 def render_recommendations():
     st.header("Smart Health Recommendations")
-    df = load_data()
+    username = st.session_state["username"]
+    bounds = get_date_bounds(username)
 
-    if df.empty:
+    if bounds is None:
         st.info("No health records found. Add data to get recommendations.")
         return
 
     st.subheader("Recommendations based on your last 30 days")
-    recent_df = get_recent_data(df, days=30)
+    # The averages come from the daily rollups and the highlights from the
+    # latest few records, so no 30-day frame is read
+    recent_start = bounds[1] - timedelta(days=30)
     
     # We can show both a summary and daily highlights
-    summary_recs = generate_recommendations_text(recent_df.copy())
+    with span("recommendations.summary"):
+        summary_recs = generate_recommendations_text(summarize_records(username, 'day', recent_start.date(), bounds[1].date()))
     st.write("#### Overall Summary:")
     for rec in summary_recs:
         if "Elevated" in rec or "High" in rec:
@@ -135,15 +162,35 @@ def render_recommendations():
         else:
             st.success(rec)
 
+    # Trends and unusual readings come from the trend index, which is updated
+    # as each record is saved
+    with span("recommendations.trends"):
+        trends = get_trends(username)
+        trend_lines = generate_trend_text(current_trends(trends))
+        anomaly_lines = generate_anomaly_text(anomaly_frame(trends, recent_start).tail(MAX_LISTED_ANOMALIES))
+    st.write("#### Your Trends:")
+    if trend_lines:
+        for line in trend_lines:
+            st.write(f"- {line}")
+    else:
+        st.write(f"Trends appear after {MIN_BASELINE_READINGS} readings of a metric.")
+    if anomaly_lines:
+        st.write("#### Unusual Readings:")
+        for line in anomaly_lines:
+            st.warning(line)
+
     st.write("#### Daily Highlights:")
-    # Show recommendations for the last 5 days as highlights
-    daily_highlights_df = recent_df.tail(5)
+    # Show recommendations for the last 5 entries of the 30 days as highlights
+    with span("recommendations.load") as timing:
+        daily_highlights_df = slice_dates(load_last_readings(username, 5), recent_start)
+        timing.rows = len(daily_highlights_df)
     if daily_highlights_df.empty:
         st.write("No recent entries for daily highlights.")
     else:
-        for _, row in daily_highlights_df.iterrows():
-            daily_rec = generate_daily_recommendation(row)
-            date_str = row['date'].strftime('%Y-%m-%d')
+        with span("recommendations.daily", rows=len(daily_highlights_df)):
+            daily_recs = generate_daily_recommendations(daily_highlights_df)
+        for date, daily_rec in zip(daily_highlights_df['date'], daily_recs):
+            date_str = date.strftime('%Y-%m-%d')
             st.write(f"**{date_str}:** {daily_rec}")
 
     st.markdown("---")
@@ -0,0 +1,91 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, timedelta
+
+import yaml
+from yaml.loader import SafeLoader
+
+from features.storage.paths import list_usernames
+
+# Headless report generation for clinics, one PDF per user, spread across CPU cores:
+#   python -m features.reports.batch [--start YYYY-MM-DD] [--end YYYY-MM-DD] [--users a b ...]
+# Without dates the previous calendar month is reported.
+
+def _previous_month(today):
+    end_date = today.replace(day=1) - timedelta(days=1)
+    return end_date.replace(day=1), end_date
+
+def _init_worker(storage_options, healthy_ranges):
+    from features.storage.storage import configure_storage
+    from features.thresholds.thresholds import configure_thresholds
+
+    configure_storage(storage_options)
+    configure_thresholds(healthy_ranges)
+
+def _generate_user_report(username, start_date, end_date, output_dir):
+    # Runs in a worker process; returns (username, path or None, seconds)
+    from features.reports.reports import build_report
+    from features.storage.storage import iter_records
+
+    started = time.perf_counter()
+    if next(iter_records(username, start_date, end_date, chunk_size=1), None) is None:
+        return username, None, time.perf_counter() - started
+    path = os.path.join(output_dir, f"{username}_health_report_{start_date}_{end_date}.pdf")
+    build_report(username, start_date, end_date, path)
+    return username, path, time.perf_counter() - started
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate PDF health reports for many users in parallel.")
+    parser.add_argument('--start', type=date.fromisoformat, help="First day of the report (default: start of last month)")
+    parser.add_argument('--end', type=date.fromisoformat, help="Last day of the report (default: end of last month)")
+    parser.add_argument('--users', nargs='+', help="Users to report on (default: every user under data/)")
+    parser.add_argument('--output-dir', default="batch_reports", help="Directory the PDFs are written to")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes (default: one per CPU)")
+    parser.add_argument('--config', default="config.yaml", help="App config providing the storage settings and healthy ranges")
+    args = parser.parse_args(argv)
+
+    default_start, default_end = _previous_month(date.today())
+    start_date = args.start or default_start
+    end_date = args.end or default_end
+    if start_date > end_date:
+        parser.error("--start must not be after --end")
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config) as file:
+            config = yaml.load(file, Loader=SafeLoader) or {}
+
+    usernames = args.users or list_usernames()
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"Generating reports for {len(usernames)} users from {start_date} to {end_date} with {args.workers} workers")
+
+    started = time.perf_counter()
+    generated = skipped = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(config.get('storage'), config.get('healthy_ranges'))) as executor:
+        futures = {
+            executor.submit(_generate_user_report, username, start_date, end_date, args.output_dir): username
+            for username in usernames
+        }
+        for future in as_completed(futures):
+            username = futures[future]
+            try:
+                _, path, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{username}: failed ({e})")
+                continue
+            if path is None:
+                skipped += 1
+            else:
+                generated += 1
+                print(f"{username}: {path} ({seconds:.1f}s)")
+
+    elapsed = time.perf_counter() - started
+    rate = generated / elapsed if elapsed else 0.0
+    print(f"Generated {generated} reports ({skipped} without data, {failed} failed) in {elapsed:.1f}s, {rate:.1f} reports/s")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from features.storage.atomic import write_durably
+from features.storage.paths import get_user_data_dir
+from features.storage.storage import get_data_version
+
+# Report generation runs on this pool instead of the Streamlit script thread,
+# shared by every session in the process
+REPORT_WORKERS = 2
+
+# Finished PDFs are kept under data/<username>/reports/, keyed by date range
+# and data version, so a repeat download of unchanged data is instant
+REPORTS_DIR = "reports"
+
+MAX_TRACKED_JOBS = 256
+
+_executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+_jobs = {}
+_jobs_lock = threading.Lock()
+
+class ReportJob:
+    # Handle for one report: progress is a 0..1 fraction, path is set when done
+
+    def __init__(self, path, done=False):
+        self.path = path
+        self.progress = 1.0 if done else 0.0
+        self.error = None
+        self._done = threading.Event()
+        if done:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def _run(self, username, start_date, end_date):
+        from features.reports.reports import build_report
+
+        try:
+            def write(report_file):
+                build_report(username, start_date, end_date, report_file, progress=self._set_progress)
+            write_durably(self.path, write, mode='wb')
+            _remove_stale_reports(self.path, start_date, end_date)
+            self.progress = 1.0
+        except Exception as e:
+            self.error = e
+        finally:
+            self._done.set()
+
+    def _set_progress(self, fraction):
+        # Leave headroom for writing out the finished document
+        self.progress = 0.95 * fraction
+
+def _version_tag(username):
+    return hashlib.sha1(repr(get_data_version(username)).encode()).hexdigest()[:12]
+
+def _report_path(username, start_date, end_date, version_tag):
+    return os.path.join(get_user_data_dir(username), REPORTS_DIR, f"health_report_{start_date}_{end_date}_{version_tag}.pdf")
+
+def _remove_stale_reports(path, start_date, end_date):
+    # Older versions of the same range are never served again
+    report_dir = os.path.dirname(path)
+    prefix = f"health_report_{start_date}_{end_date}_"
+    for entry in os.scandir(report_dir):
+        if entry.name.startswith(prefix) and entry.path != path and entry.name.endswith('.pdf'):
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+def get_report_job(username, start_date, end_date):
+    # The running or finished job for the current data, or None if there is none yet
+    path = _report_path(username, start_date, end_date, _version_tag(username))
+    with _jobs_lock:
+        job = _jobs.get(path)
+    if job is not None and (not job.done() or job.error is not None or os.path.exists(path)):
+        return job
+    if os.path.exists(path):
+        return ReportJob(path, done=True)
+    return None
+
+def submit_report(username, start_date, end_date):
+    # Starts generating the report in the background unless it is already
+    # cached or in progress, and returns its job handle
+    path = _report_path(username, start_date, end_date, _version_tag(username))
+    with _jobs_lock:
+        job = _jobs.get(path)
+        if job is not None and not job.done():
+            return job
+        if os.path.exists(path):
+            return ReportJob(path, done=True)
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        job = ReportJob(path)
+        _jobs[path] = job
+        if len(_jobs) > MAX_TRACKED_JOBS:
+            for finished in [key for key, tracked in _jobs.items() if tracked.done()]:
+                del _jobs[finished]
+    _executor.submit(job._run, username, start_date, end_date)
+    return job
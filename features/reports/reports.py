@@ -1,32 +1,11 @@
 import streamlit as st
-import pandas as pd
 from fpdf import FPDF
 from datetime import datetime
-import os
-from features.recommendations.recommendations import generate_daily_recommendation
-
-def load_data():
-    # Get the current username from session state
-    username = st.session_state["username"]
-    
-    # Construct user-specific file path
-    user_data_dir = os.path.join("data", username)
-    file_path = os.path.join(user_data_dir, "health_records.csv")
-    
-    # Ensure the user-specific directory exists (though input_form should create it)
-    os.makedirs(user_data_dir, exist_ok=True)
-    if os.path.exists(file_path) and os.path.getsize(file_path) > 0:
-        try:
-            df = pd.read_csv(file_path)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df.dropna(subset=['date'], inplace=True) # Drop rows where date could not be parsed
-            df = df.sort_values(by='date')
-            return df
-        except pd.errors.EmptyDataError:
-            return pd.DataFrame()
-    else:
-        pd.DataFrame(columns=['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes']).to_csv(file_path, index=False)
-        return pd.DataFrame()
+from features.export.export import EXPORT_FORMATS, export_to_file
+from features.storage.storage import get_date_bounds, iter_records, summarize_records
+from features.recommendations.recommendations import generate_daily_recommendations
+from features.reports.jobs import get_report_job, submit_report
+from features.telemetry.telemetry import span
 
 class PDF(FPDF):
     def __init__(self, username=None):
@@ -56,118 +35,184 @@ class PDF(FPDF):
         self.multi_cell(0, 5, body)
         self.ln(5)
 
-    def add_dataframe_as_table(self, df_to_print):
-        # Use a smaller font for the table
-        self.set_font('Arial', '', 8)
-        
-        # Set column widths to fit landscape page (approx. 277mm available)
-        col_widths = {
-            'date': 40, # Increased width for datetime
-            'blood_pressure': 25,
-            'sugar_level': 25,
-            'pulse_rate': 25,
-            'notes': 55,
-            'recommendation': 105 # Adjusted to fit total width
-        }
-        
-        # --- Table Header ---
+    # Set column widths to fit landscape page (approx. 277mm available)
+    col_widths = {
+        'date': 40, # Increased width for datetime
+        'blood_pressure': 25,
+        'sugar_level': 25,
+        'pulse_rate': 25,
+        'notes': 55,
+        'recommendation': 105 # Adjusted to fit total width
+    }
+
+    def add_table_header(self, columns):
         self.set_font('Arial', 'B', 9)
-        header_labels = [h.replace('_', ' ').title() for h in df_to_print.columns]
-        for i, header in enumerate(header_labels):
-            self.cell(col_widths[df_to_print.columns[i]], 10, header, 1, 0, 'C')
+        for col_name in columns:
+            self.cell(self.col_widths[col_name], 10, col_name.replace('_', ' ').title(), 1, 0, 'C')
         self.ln()
 
-        # --- Table Body ---
+    def add_table_rows(self, df_to_print):
+        # Formats whole columns at once and walks plain tuples, which is much
+        # faster than building a Series per row with iterrows()
         self.set_font('Arial', '', 8)
-        for _, row in df_to_print.iterrows():
-            # Use a fixed height for all cells in a row
-            cell_height = 10
-            
+        # Use a fixed height for all cells in a row
+        cell_height = 10
+
+        formatted = []
+        for col_name in df_to_print.columns:
+            if col_name == 'date':
+                values = df_to_print['date'].dt.strftime('%Y-%m-%d %H:%M:%S') # Format date to include time
+            else:
+                values = df_to_print[col_name].map(str)
             # Truncate long text to prevent overflow
-            notes = str(row['notes'])
-            if len(notes) > 35: # Approx char limit for notes width
-                notes = notes[:32] + '...'
-
-            recommendation = str(row['recommendation'])
-            if len(recommendation) > 80: # Approx char limit for recommendation width
-                recommendation = recommendation[:77] + '...'
-
-            # Create a dictionary of the potentially truncated values
-            row_values = {
-                'date': row['date'].strftime('%Y-%m-%d %H:%M:%S'), # Format date to include time
-                'blood_pressure': str(row['blood_pressure']),
-                'sugar_level': str(row['sugar_level']),
-                'pulse_rate': str(row['pulse_rate']),
-                'notes': notes,
-                'recommendation': recommendation
-            }
-
-            for col_name in df_to_print.columns:
-                self.cell(col_widths[col_name], cell_height, row_values[col_name], 1, 0, 'L')
-            
+            if col_name == 'notes': # Approx char limit for notes width
+                values = values.where(values.str.len() <= 35, values.str[:32] + '...')
+            elif col_name == 'recommendation': # Approx char limit for recommendation width
+                values = values.where(values.str.len() <= 80, values.str[:77] + '...')
+            formatted.append(values.tolist())
+
+        widths = [self.col_widths[col_name] for col_name in df_to_print.columns]
+        for row_values in zip(*formatted):
+            for width, value in zip(widths, row_values):
+                self.cell(width, cell_height, value, 1, 0, 'L')
             self.ln()
+
+    def add_dataframe_as_table(self, df_to_print):
+        self.add_table_header(df_to_print.columns)
+        self.add_table_rows(df_to_print)
         self.ln(10)
 
+REPORT_COLUMNS = ['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes', 'recommendation']
+
+# Records are read, annotated and written to the PDF this many rows at a time
+REPORT_CHUNK_ROWS = 2000
+
+SUMMARY_METRICS = [
+    ('sugar_level', "Average Sugar Level", "mg/dL"),
+    ('pulse_rate', "Average Pulse Rate", "bpm"),
+    ('systolic', "Average Systolic BP", "mmHg"),
+    ('diastolic', "Average Diastolic BP", "mmHg"),
+]
+
+def summarize_range(username, start_date, end_date):
+    # Averages for the report summary and the number of records in the range,
+    # answered from the daily rollups
+    summary = summarize_records(username, 'day', start_date, end_date)
+    averages = {col: summary[col]['mean'] for col, _, _ in SUMMARY_METRICS if col in summary}
+    return averages, summary['records']
+
+def build_report(username, start_date, end_date, output_path, progress=None):
+    # Writes the PDF report for the inclusive date range to output_path. Records
+    # stream through in chunks, so no full-range report frame is ever built.
+    # progress, if given, is called with the fraction of records written so far.
+    pdf = PDF(username=username)
+    pdf.alias_nb_pages()
+    pdf.add_page(orientation='L') # Use landscape for more space
+
+    # --- Summary Section ---
+    pdf.chapter_title("Summary of Health Metrics")
+    summary_text = f"Report Date: {datetime.now().strftime('%Y-%m-%d')}\n"
+    summary_text += f"Data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}\n\n"
+    with span("reports.summary"):
+        averages, row_count = summarize_range(username, start_date, end_date)
+    for col, label, unit in SUMMARY_METRICS:
+        if col in averages:
+            summary_text += f"{label}: {averages[col]:.2f} {unit}\n"
+    pdf.chapter_body(summary_text)
+
+    # --- Raw Data Table with Daily Recommendations ---
+    pdf.chapter_title("Daily Health Records and Recommendations")
+    pdf.add_table_header(REPORT_COLUMNS)
+    rows_written = 0
+    with span("reports.table") as timing:
+        for chunk in iter_records(username, start_date, end_date, chunk_size=REPORT_CHUNK_ROWS):
+            # Generate daily recommendations and add as a new column
+            report_chunk = chunk[REPORT_COLUMNS[:-1]].assign(recommendation=generate_daily_recommendations(chunk))
+            pdf.add_table_rows(report_chunk)
+            rows_written += len(chunk)
+            if progress is not None and row_count:
+                progress(min(rows_written / row_count, 1.0))
+        timing.rows = rows_written
+    pdf.ln(10)
+
+    with span("reports.pdf_output", rows=rows_written):
+        pdf.output(output_path)
+    return output_path
+
 def render_reports():
     st.header("Generate Health Reports")
-    df = load_data()
+    username = st.session_state["username"]
+    date_bounds = get_date_bounds(username)
 
-    if df.empty:
+    if date_bounds is None:
         st.info("No data available to generate reports. Please add some health records first.")
         return
 
+    render_report_form(username, date_bounds)
+
+@st.fragment
+def render_report_form(username, date_bounds):
+    # Picking dates or starting a report reruns only this section
     st.subheader("Select Date Range for Report")
-    min_date = df['date'].min().date()
-    max_date = df['date'].max().date()
+    min_date = date_bounds[0].date()
+    max_date = date_bounds[1].date()
     start_date = st.date_input("Start Date", min_value=min_date, max_value=max_date, value=min_date)
     end_date = st.date_input("End Date", min_value=min_date, max_value=max_date, value=max_date)
 
-    filtered_df = df[(df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)].copy()
+    # The daily rollups count the records in the range without reading them
+    with span("reports.count") as timing:
+        record_count = summarize_records(username, 'day', start_date, end_date)['records']
+        timing.rows = record_count
 
-    if filtered_df.empty:
+    if not record_count:
         st.warning("No data available for the selected date range to generate a report.")
         return
 
+    render_pdf_report(username, start_date, end_date)
+    render_export(username, start_date, end_date)
+
+def render_pdf_report(username, start_date, end_date):
+    job = get_report_job(username, start_date, end_date)
     if st.button("Generate PDF Report"):
-        username = st.session_state["username"]
-        pdf = PDF(username=username)
-        pdf.alias_nb_pages()
-        pdf.add_page(orientation='L') # Use landscape for more space
-
-        # --- Summary Section ---
-        pdf.chapter_title("Summary of Health Metrics")
-        summary_text = f"Report Date: {datetime.now().strftime('%Y-%m-%d')}\n"
-        summary_text += f"Data from {start_date.strftime('%Y-%m-%d')} to {end_date.strftime('%Y-%m-%d')}\n\n"
-        
-        bp_split = filtered_df['blood_pressure'].astype(str).str.extract(r'(\d+)/(\d+)', expand=True)
-        filtered_df['systolic'] = pd.to_numeric(bp_split[0], errors='coerce')
-        filtered_df['diastolic'] = pd.to_numeric(bp_split[1], errors='coerce')
-
-        if not filtered_df['sugar_level'].dropna().empty:
-            summary_text += f"Average Sugar Level: {filtered_df['sugar_level'].mean():.2f} mg/dL\n"
-        if not filtered_df['pulse_rate'].dropna().empty:
-            summary_text += f"Average Pulse Rate: {filtered_df['pulse_rate'].mean():.2f} bpm\n"
-        if not filtered_df['systolic'].dropna().empty:
-            summary_text += f"Average Systolic BP: {filtered_df['systolic'].mean():.2f} mmHg\n"
-        if not filtered_df['diastolic'].dropna().empty:
-            summary_text += f"Average Diastolic BP: {filtered_df['diastolic'].mean():.2f} mmHg\n"
-        pdf.chapter_body(summary_text)
-        
-        # --- Raw Data Table with Daily Recommendations ---
-        pdf.chapter_title("Daily Health Records and Recommendations")
-        
-        # Generate daily recommendations and add as a new column
-        filtered_df['recommendation'] = filtered_df.apply(generate_daily_recommendation, axis=1)
-        
-        report_df = filtered_df[['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes', 'recommendation']].copy()
-        pdf.add_dataframe_as_table(report_df)
-
-        # --- PDF Download ---
-        pdf_output = bytes(pdf.output(dest='S'))
+        job = submit_report(username, start_date, end_date)
+
+    if job is None:
+        return
+    if not job.done():
+        render_report_progress(job)
+    elif job.error is not None:
+        st.error(f"Could not generate the PDF report: {job.error}")
+    else:
         st.success("PDF report generated successfully!")
+        with open(job.path, 'rb') as report_file:
+            st.download_button(
+                label="Download Report",
+                data=report_file,
+                file_name=f"health_report_{start_date}_{end_date}.pdf",
+                mime="application/pdf"
+            )
+
+def render_export(username, start_date, end_date):
+    # The export is only built when asked for, streaming the records into a
+    # temporary file that Streamlit then reads and serves
+    st.subheader("Export Raw Data")
+    export_format = st.selectbox("Format", list(EXPORT_FORMATS), format_func=lambda export_format: EXPORT_FORMATS[export_format][0],
+                                 key="export_format")
+    label, extension, mime = EXPORT_FORMATS[export_format]
+    if not st.button(f"Prepare {label} Export"):
+        return
+    with export_to_file(username, export_format, start_date, end_date) as export_file:
         st.download_button(
-            label="Download Report",
-            data=pdf_output,
-            file_name=f"health_report_{start_date}_{end_date}.pdf",
-            mime="application/pdf"
+            label=f"Download {label}",
+            data=export_file,
+            file_name=f"health_records_{start_date}_{end_date}.{extension}",
+            mime=mime,
+            on_click='ignore'
         )
+
+@st.fragment(run_every=1)
+def render_report_progress(job):
+    # Polls the background job without rerunning the rest of the page
+    st.progress(job.progress, text="Generating PDF report...")
+    if job.done():
+        st.rerun()
@@ -0,0 +1,20 @@
+import os
+import tempfile
+
+def write_durably(file_path, write, mode='w'):
+    # Writes through a temporary file so readers only ever see complete files
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(file_path), suffix='.tmp')
+    try:
+        if 'b' in mode:
+            tmp_file = os.fdopen(fd, mode)
+        else:
+            tmp_file = os.fdopen(fd, mode, newline='', encoding='utf-8')
+        with tmp_file:
+            write(tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,42 @@
+class StorageBackend:
+    # Interface shared by the record stores selectable under `storage` in config.yaml
+
+    name = None
+
+    # Whether read() only touches the data inside the requested date range.
+    # Backends that can't do this are read once and sliced in memory instead.
+    pushes_down_ranges = False
+
+    def version(self, username):
+        # Cheap token that changes whenever the user's records change; None if there are none
+        raise NotImplementedError
+
+    def read(self, username, start=None, end=None):
+        # Records with start <= date < end (either bound may be None), sorted by date
+        raise NotImplementedError
+
+    def iter_chunks(self, username, start=None, end=None, chunk_size=5000):
+        # Records in date order, as frames of at most chunk_size rows
+        df = self.read(username, start, end)
+        for offset in range(0, len(df), chunk_size):
+            yield df.iloc[offset:offset + chunk_size]
+
+    def read_last(self, username, count):
+        # The latest count records, sorted by date
+        return self.read(username).tail(count)
+
+    def date_bounds(self, username):
+        # (first, last) record timestamps, or None if the user has no records
+        df = self.read(username)
+        if df.empty:
+            return None
+        return df['date'].iloc[0], df['date'].iloc[-1]
+
+    def append(self, username, record):
+        raise NotImplementedError
+
+    def append_many(self, username, df):
+        # Writes a batch of page-shaped records; backends override this to
+        # commit the whole batch at once
+        for record in df.to_dict('records'):
+            self.append(username, record)
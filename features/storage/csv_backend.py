@@ -0,0 +1,201 @@
+import csv
+import io
+import os
+import threading
+
+import pandas as pd
+
+from features.storage.atomic import write_durably
+from features.storage.backend import StorageBackend
+from features.storage.locks import user_lock
+from features.storage.paths import get_user_data_dir
+from features.storage.records import BLOOD_PRESSURE_PATTERN, RECORD_COLUMNS, backfill_blood_pressure
+from features.telemetry.telemetry import span
+
+RECORDS_FILE = "health_records.csv"
+# New records are appended here and periodically merged into RECORDS_FILE
+RECORDS_LOG_FILE = "health_records.log.csv"
+
+# Once the append log grows past this size it is compacted in the background
+COMPACT_LOG_BYTES = 64 * 1024
+
+def get_records_path(username):
+    return os.path.join(get_user_data_dir(username), RECORDS_FILE)
+
+def get_records_log_path(username):
+    return os.path.join(get_user_data_dir(username), RECORDS_LOG_FILE)
+
+def _stat_version(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _read_log(log_bytes):
+    if not log_bytes:
+        return pd.DataFrame(columns=RECORD_COLUMNS)
+    return pd.read_csv(io.BytesIO(log_bytes), header=None, names=RECORD_COLUMNS)
+
+class CsvBackend(StorageBackend):
+    # One health_records.csv per user plus an append-only log of recent saves
+
+    name = 'csv'
+
+    def __init__(self):
+        self._compacting = set()
+        self._compacting_lock = threading.Lock()
+
+    def version(self, username):
+        # Cheap stat-based version of a user's records; None if there is no file yet
+        version = _stat_version(get_records_path(username))
+        if version is None:
+            return None
+        return (version, _stat_version(get_records_log_path(username)))
+
+    def read(self, username, start=None, end=None):
+        user_data_dir = get_user_data_dir(username)
+        file_path = get_records_path(username)
+        # Both files are read under the lock: compaction replaces them one
+        # after the other, and a read in between would see the log twice
+        with user_lock(user_data_dir):
+            if not os.path.exists(file_path):
+                # If the file doesn't exist, create an empty one with the correct headers
+                pd.DataFrame(columns=RECORD_COLUMNS).to_csv(file_path, index=False)
+            with open(file_path, 'rb') as records_file:
+                records_bytes = records_file.read()
+            try:
+                with open(get_records_log_path(username), 'rb') as log_file:
+                    log_bytes = log_file.read()
+            except FileNotFoundError:
+                log_bytes = b''
+
+        with span("csv.parse") as timing:
+            try:
+                df = pd.read_csv(io.BytesIO(records_bytes))
+            except pd.errors.EmptyDataError:
+                df = pd.DataFrame(columns=RECORD_COLUMNS)
+            log_df = _read_log(log_bytes)
+            timing.rows = len(df) + len(log_df)
+        if df.empty:
+            df = log_df
+        elif not log_df.empty:
+            df = pd.concat([df, log_df], ignore_index=True)
+        if df.empty:
+            return pd.DataFrame()
+        with span("csv.parse_dates", rows=len(df)):
+            df['date'] = pd.to_datetime(df['date'], errors='coerce')
+            df = df.dropna(subset=['date']) # Drop rows where date could not be parsed
+        # Files written before BP was stored as numbers still need their strings split
+        with span("csv.backfill_blood_pressure", rows=len(df)):
+            df['systolic'], df['diastolic'] = backfill_blood_pressure(df)
+        df = df[RECORD_COLUMNS]
+        df = df.sort_values(by='date', kind='stable')
+        if start is not None:
+            df = df[df['date'] >= start]
+        if end is not None:
+            df = df[df['date'] < end]
+        return df
+
+    def append(self, username, record):
+        # Appends one row to the user's log under the advisory lock and fsyncs it,
+        # so a save costs the same no matter how long the history is.
+        user_data_dir = get_user_data_dir(username)
+        log_path = get_records_log_path(username)
+        with user_lock(user_data_dir):
+            with open(log_path, 'a', newline='', encoding='utf-8') as log_file:
+                csv.writer(log_file).writerow([record.get(col, '') for col in RECORD_COLUMNS])
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            log_size = os.path.getsize(log_path)
+
+        if log_size >= COMPACT_LOG_BYTES:
+            self.schedule_compaction(username)
+
+    def append_many(self, username, df):
+        # Appends the whole batch to the log with one write and one fsync
+        user_data_dir = get_user_data_dir(username)
+        log_path = get_records_log_path(username)
+        with user_lock(user_data_dir):
+            with open(log_path, 'a', newline='', encoding='utf-8') as log_file:
+                log_file.write(df[RECORD_COLUMNS].to_csv(header=False, index=False))
+                log_file.flush()
+                os.fsync(log_file.fileno())
+            log_size = os.path.getsize(log_path)
+
+        # A batch is already a bulk write, so fold it into the records file
+        # now rather than leaving a large log to every reader
+        if log_size >= COMPACT_LOG_BYTES:
+            self.compact(username)
+
+    def schedule_compaction(self, username):
+        with self._compacting_lock:
+            if username in self._compacting:
+                return
+            self._compacting.add(username)
+
+        def run():
+            try:
+                self.compact(username)
+            finally:
+                with self._compacting_lock:
+                    self._compacting.discard(username)
+
+        threading.Thread(target=run, name=f"compact-{username}", daemon=True).start()
+
+    def compact(self, username, force=False):
+        # Merges the append log into the canonical date-sorted file. The expensive
+        # merge runs without the lock; only the final swap is done under it, and it
+        # is abandoned if another compaction replaced the canonical file meanwhile.
+        # force=True rewrites the file even with an empty log, which upgrades
+        # older files to the current columns.
+        user_data_dir = get_user_data_dir(username)
+        file_path = get_records_path(username)
+        log_path = get_records_log_path(username)
+
+        with user_lock(user_data_dir):
+            base_version = _stat_version(file_path)
+            try:
+                with open(log_path, 'rb') as log_file:
+                    log_bytes = log_file.read()
+            except FileNotFoundError:
+                log_bytes = b''
+        if not log_bytes and not force:
+            return
+
+        # Read everything as text so values round-trip into the file unchanged
+        try:
+            base_df = pd.read_csv(file_path, dtype=str, keep_default_na=False)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            base_df = pd.DataFrame(columns=RECORD_COLUMNS)
+        if log_bytes:
+            log_df = pd.read_csv(io.BytesIO(log_bytes), header=None, names=RECORD_COLUMNS, dtype=str, keep_default_na=False)
+            merged = pd.concat([base_df, log_df], ignore_index=True)
+        else:
+            merged = base_df
+        merged = merged.reindex(columns=RECORD_COLUMNS, fill_value='')
+
+        # Backfill the numeric BP columns of legacy rows in one vectorized pass
+        needs_parse = ((merged['systolic'] == '') | (merged['diastolic'] == '')) & (merged['blood_pressure'] != '')
+        if needs_parse.any():
+            bp_split = merged.loc[needs_parse, 'blood_pressure'].str.extract(BLOOD_PRESSURE_PATTERN, expand=True)
+            merged.loc[needs_parse, 'systolic'] = bp_split[0].fillna('')
+            merged.loc[needs_parse, 'diastolic'] = bp_split[1].fillna('')
+
+        merged = merged.sort_values(
+            by='date', kind='stable', na_position='last',
+            key=lambda dates: pd.to_datetime(dates, errors='coerce')
+        )
+
+        with user_lock(user_data_dir):
+            if _stat_version(file_path) != base_version:
+                return
+            write_durably(file_path, lambda f: merged.to_csv(f, index=False))
+            # Keep anything appended to the log after it was read
+            try:
+                with open(log_path, 'rb') as log_file:
+                    log_file.seek(len(log_bytes))
+                    tail = log_file.read()
+            except FileNotFoundError:
+                return
+            write_durably(log_path, lambda f: f.write(tail), mode='wb')
@@ -0,0 +1,74 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+from features.storage.records import reading_value
+from features.thresholds.thresholds import HEALTHY_RANGES
+
+# Out-of-range flags computed once per record when it is saved. Each record
+# gets a bitmask with one bit per metric whose reading lies outside the
+# healthy min..max, and only flagged records enter the index: a date-sorted
+# list of [timestamp, bitmask, sugar_level, pulse_rate, systolic, diastolic].
+# The outlier view and alerting read this index instead of the records.
+FLAG_METRICS = ['sugar_level', 'pulse_rate', 'systolic', 'diastolic']
+FLAG_BITS = {metric: 1 << bit for bit, metric in enumerate(FLAG_METRICS)}
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+def flag_bits(df):
+    # uint8 bitmask per row against the current healthy ranges
+    bits = np.zeros(len(df), dtype=np.uint8)
+    for metric in FLAG_METRICS:
+        values = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        ranges = HEALTHY_RANGES[metric]
+        # NaN compares False on both sides, so missing readings are never flagged
+        out_of_range = (values < ranges['min']) | (values > ranges['max'])
+        bits |= np.where(out_of_range, FLAG_BITS[metric], 0).astype(np.uint8)
+    return pd.Series(bits, index=df.index)
+
+def _entries(df, bits):
+    flagged = bits.to_numpy() != 0
+    if not flagged.any():
+        return []
+    timestamps = df['date'][flagged].dt.strftime(TIMESTAMP_FORMAT).tolist()
+    columns = [pd.to_numeric(df[metric][flagged], errors='coerce').astype('float64') for metric in FLAG_METRICS]
+    values = [[None if pd.isna(value) else value for value in column.tolist()] for column in columns]
+    return [
+        [timestamp, int(mask), *row]
+        for timestamp, mask, row in zip(timestamps, bits[flagged].tolist(), zip(*values))
+    ]
+
+def build_flags(df, version=None):
+    # Recomputes the whole index in one vectorized pass, e.g. after the
+    # healthy ranges changed
+    entries = [] if df.empty else _entries(df, flag_bits(df))
+    return {'version': version, 'records': entries}
+
+def add_record(flags, record):
+    # One record's entry, computed as flag_bits and _entries do for a frame
+    values = [reading_value(record.get(metric)) for metric in FLAG_METRICS]
+    mask = 0
+    for metric, value in zip(FLAG_METRICS, values):
+        ranges = HEALTHY_RANGES[metric]
+        if value is not None and (value < ranges['min'] or value > ranges['max']):
+            mask |= FLAG_BITS[metric]
+    if not mask:
+        return
+    timestamp = pd.Timestamp(record['date']).strftime(TIMESTAMP_FORMAT)
+    # Records usually arrive in date order, so this is an append
+    position = bisect.bisect_right(flags['records'], timestamp, key=lambda existing: existing[0])
+    flags['records'].insert(position, [timestamp, mask, *values])
+
+def flagged_frame(flags, metric=None):
+    # The flagged records as a frame, optionally only those flagged on metric
+    df = pd.DataFrame(flags['records'], columns=['date', 'flags', *FLAG_METRICS])
+    df['date'] = pd.to_datetime(df['date'], format=TIMESTAMP_FORMAT)
+    df['flags'] = df['flags'].astype('uint8')
+    for column in FLAG_METRICS:
+        # Whole-number readings (everything the input form produces) display without decimals
+        values = df[column].dropna()
+        if (values == values.round()).all():
+            df[column] = df[column].astype('Int64')
+    if metric is not None:
+        df = df[(df['flags'] & FLAG_BITS[metric]) != 0]
+    return df
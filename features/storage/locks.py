@@ -0,0 +1,52 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Advisory lock shared by every writer of a user's data directory, across
+# threads and across server processes. It is reentrant within a thread, so a
+# save can hold it while the backend's own write takes it again.
+LOCK_FILE = ".lock"
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()
+
+def _get_thread_lock(lock_path):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(lock_path, threading.Lock())
+
+@contextmanager
+def user_lock(user_data_dir):
+    os.makedirs(user_data_dir, exist_ok=True)
+    lock_path = os.path.join(user_data_dir, LOCK_FILE)
+    held = getattr(_held, 'paths', None)
+    if held is None:
+        held = _held.paths = set()
+    if lock_path in held:
+        yield
+        return
+
+    # msvcrt locks are per process, so threads also serialize on a local lock
+    with _get_thread_lock(lock_path):
+        with open(lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            held.add(lock_path)
+            try:
+                yield
+            finally:
+                held.discard(lock_path)
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,52 @@
+import argparse
+import time
+
+from features.storage.csv_backend import CsvBackend
+from features.storage.parquet_backend import ParquetBackend
+from features.storage.paths import list_usernames
+from features.storage.records import to_typed
+from features.storage.sqlite_backend import SqliteBackend
+from features.storage.storage import invalidate
+
+# One-shot copy of the CSV record files into one of the typed stores:
+#   python -m features.storage.migrate [--to parquet|sqlite] [username ...]
+# The CSV files are left untouched, so the migration can be re-run safely.
+#
+# Older CSV files that only have "120/80" blood_pressure strings can instead
+# be rewritten in place with numeric systolic/diastolic columns:
+#   python -m features.storage.migrate --backfill-csv [username ...]
+
+def migrate_user(username, source, target):
+    typed = to_typed(source.read(username))
+    target.write_typed(username, typed, replace=True)
+    # Cached frames and indexes were built from the user's previous records
+    invalidate(username, everywhere=True)
+    return len(typed)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Migrate health records from CSV to a typed storage backend.")
+    parser.add_argument('--to', choices=['parquet', 'sqlite'], default='parquet', help="Target storage backend")
+    parser.add_argument('usernames', nargs='*', help="Users to migrate (default: every user under data/)")
+    parser.add_argument('--backfill-csv', action='store_true', help="Add numeric BP columns to the CSV files in place instead of migrating")
+    args = parser.parse_args(argv)
+
+    source = CsvBackend()
+    if args.backfill_csv:
+        usernames = args.usernames or list_usernames()
+        for username in usernames:
+            source.compact(username, force=True)
+            print(f"{username}: backfilled")
+        return
+
+    target = ParquetBackend() if args.to == 'parquet' else SqliteBackend()
+    usernames = args.usernames or list_usernames()
+    started = time.perf_counter()
+    total = 0
+    for username in usernames:
+        count = migrate_user(username, source, target)
+        total += count
+        print(f"{username}: {count} records")
+    print(f"Migrated {total} records for {len(usernames)} users in {time.perf_counter() - started:.1f}s")
+
+if __name__ == "__main__":
+    main()
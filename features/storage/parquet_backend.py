@@ -0,0 +1,149 @@
+import os
+
+import pandas as pd
+
+from features.storage.atomic import write_durably
+from features.storage.backend import StorageBackend
+from features.storage.locks import user_lock
+from features.storage.paths import get_user_data_dir
+from features.storage.records import TYPED_COLUMNS, from_typed, to_typed
+
+# One Parquet file per calendar month, e.g. data/<username>/parquet/2024-05.parquet
+PARTITION_DIR = "parquet"
+
+def get_partition_dir(username):
+    return os.path.join(get_user_data_dir(username), PARTITION_DIR)
+
+def _period_of(timestamp):
+    return timestamp.strftime('%Y-%m')
+
+class ParquetBackend(StorageBackend):
+    # Typed columnar records partitioned by month; range reads only open the
+    # partitions that overlap the requested dates
+
+    name = 'parquet'
+    pushes_down_ranges = True
+
+    def __init__(self):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise RuntimeError("The parquet storage backend requires pyarrow (pip install pyarrow).") from e
+        self._schema = pyarrow.schema([
+            ('timestamp', pyarrow.timestamp('ms')),
+            ('systolic', pyarrow.int16()),
+            ('diastolic', pyarrow.int16()),
+            ('sugar', pyarrow.float32()),
+            ('pulse', pyarrow.int16()),
+            ('notes', pyarrow.string()),
+        ])
+
+    def _partitions(self, username):
+        partition_dir = get_partition_dir(username)
+        if not os.path.isdir(partition_dir):
+            return []
+        return sorted(
+            (entry for entry in os.scandir(partition_dir) if entry.name.endswith('.parquet')),
+            key=lambda entry: entry.name
+        )
+
+    def version(self, username):
+        partitions = self._partitions(username)
+        if not partitions:
+            return None
+        return tuple((entry.name, entry.stat().st_mtime_ns, entry.stat().st_size) for entry in partitions)
+
+    def _partition_paths(self, username, start=None, end=None):
+        paths = []
+        for entry in self._partitions(username):
+            period = entry.name[:-len('.parquet')]
+            if start is not None and period < _period_of(start):
+                continue
+            if end is not None and period > _period_of(end - pd.Timedelta(1)):
+                continue
+            paths.append(entry.path)
+        return paths
+
+    def _read_partition(self, path, start=None, end=None):
+        typed = pd.read_parquet(path, dtype_backend='numpy_nullable')
+        typed['timestamp'] = typed['timestamp'].astype('datetime64[ns]')
+        if start is not None:
+            typed = typed[typed['timestamp'] >= start]
+        if end is not None:
+            typed = typed[typed['timestamp'] < end]
+        return typed
+
+    def read_typed(self, username, start=None, end=None):
+        paths = self._partition_paths(username, start, end)
+        if not paths:
+            return to_typed(pd.DataFrame())
+        typed = pd.concat([self._read_partition(path, start, end) for path in paths], ignore_index=True)
+        return typed.sort_values(by='timestamp', kind='stable')
+
+    def iter_chunks(self, username, start=None, end=None, chunk_size=5000):
+        # Partitions hold disjoint months, so reading them in name order keeps
+        # memory bounded by one month plus one chunk
+        for path in self._partition_paths(username, start, end):
+            df = from_typed(self._read_partition(path, start, end).sort_values(by='timestamp', kind='stable'))
+            for offset in range(0, len(df), chunk_size):
+                yield df.iloc[offset:offset + chunk_size]
+
+    def read_last(self, username, count):
+        # Opens monthly partitions from the newest back until count records are found
+        months = []
+        found = 0
+        for entry in reversed(self._partitions(username)):
+            months.append(self._read_partition(entry.path))
+            found += len(months[-1])
+            if found >= count:
+                break
+        if not months:
+            return pd.DataFrame()
+        typed = pd.concat(months[::-1], ignore_index=True).sort_values(by='timestamp', kind='stable')
+        return from_typed(typed.tail(count))
+
+    def date_bounds(self, username):
+        # Only the first and last monthly partitions need to be opened
+        partitions = self._partitions(username)
+        if not partitions:
+            return None
+        first = pd.read_parquet(partitions[0].path, columns=['timestamp'])['timestamp']
+        last = pd.read_parquet(partitions[-1].path, columns=['timestamp'])['timestamp']
+        if first.empty or last.empty:
+            return super().date_bounds(username)
+        return pd.Timestamp(first.min()), pd.Timestamp(last.max())
+
+    def read(self, username, start=None, end=None):
+        return from_typed(self.read_typed(username, start, end))
+
+    def append(self, username, record):
+        self.write_typed(username, to_typed(pd.DataFrame([record])))
+
+    def append_many(self, username, df):
+        self.write_typed(username, to_typed(df))
+
+    def write_typed(self, username, typed, replace=False):
+        # Merges typed records into their monthly partitions. Only the touched
+        # months are rewritten; replace=True drops every existing partition first.
+        partition_dir = get_partition_dir(username)
+        os.makedirs(partition_dir, exist_ok=True)
+        with user_lock(get_user_data_dir(username)):
+            if replace:
+                for entry in self._partitions(username):
+                    os.remove(entry.path)
+            periods = typed['timestamp'].dt.strftime('%Y-%m')
+            for period, month in typed.groupby(periods, sort=True):
+                path = os.path.join(partition_dir, f"{period}.parquet")
+                if os.path.exists(path):
+                    existing = pd.read_parquet(path, dtype_backend='numpy_nullable')
+                    existing['timestamp'] = existing['timestamp'].astype('datetime64[ns]')
+                    month = pd.concat([existing, month], ignore_index=True)
+                month = month[TYPED_COLUMNS].sort_values(by='timestamp', kind='stable')
+                self._write_partition(path, month)
+
+    def _write_partition(self, path, month):
+        import pyarrow
+        import pyarrow.parquet as pq
+
+        table = pyarrow.Table.from_pandas(month, schema=self._schema, preserve_index=False)
+        write_durably(path, lambda f: pq.write_table(table, f), mode='wb')
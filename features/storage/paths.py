@@ -0,0 +1,13 @@
+import os
+
+# Kept free of pandas so modules that only need the data directory, like the
+# credential store behind the login form, don't import the data stack
+DATA_DIR = "data"
+
+def get_user_data_dir(username):
+    return os.path.join(DATA_DIR, username)
+
+def list_usernames():
+    if not os.path.isdir(DATA_DIR):
+        return []
+    return sorted(entry.name for entry in os.scandir(DATA_DIR) if entry.is_dir() and not entry.name.startswith('.'))
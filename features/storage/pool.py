@@ -0,0 +1,42 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+class ConnectionPool:
+    # Small pool of WAL-mode connections shared by every Streamlit session in the
+    # process; schema is created on the first connection
+
+    def __init__(self, database_path, schema, size=8):
+        self.database_path = database_path
+        self.schema = schema
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self):
+        connection = sqlite3.connect(self.database_path, timeout=30, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with self._schema_lock:
+            if not self._schema_ready:
+                connection.executescript(self.schema)
+                self._schema_ready = True
+        return connection
+
+    @contextmanager
+    def connection(self):
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = self._connect()
+        try:
+            yield connection
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            try:
+                self._idle.put_nowait(connection)
+            except queue.Full:
+                connection.close()
@@ -0,0 +1,131 @@
+import math
+
+import pandas as pd
+
+# Columns of the record frames handed to the pages. systolic and diastolic
+# were added after blood_pressure, so they come last to keep older CSV rows valid.
+RECORD_COLUMNS = ['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes', 'systolic', 'diastolic']
+
+# Matched from the start of the text, as re.match does, so " 120/80" or
+# "120.5/80" are not read as blood pressures
+BLOOD_PRESSURE_PATTERN = r'^(\d+)/(\d+)'
+
+# Columns of the typed record layout used by the columnar backends
+TYPED_COLUMNS = ['timestamp', 'systolic', 'diastolic', 'sugar', 'pulse', 'notes']
+
+def backfill_blood_pressure(df):
+    # Returns numeric (systolic, diastolic) series for the records, parsing
+    # legacy "120/80" strings in one vectorized pass. Only rows that have a
+    # BP string but no numbers yet are parsed.
+    systolic = pd.to_numeric(df['systolic'], errors='coerce') if 'systolic' in df else pd.Series(float('nan'), index=df.index)
+    diastolic = pd.to_numeric(df['diastolic'], errors='coerce') if 'diastolic' in df else pd.Series(float('nan'), index=df.index)
+    needs_parse = (systolic.isna() | diastolic.isna()) & df['blood_pressure'].notna()
+    if needs_parse.any():
+        bp_split = df.loc[needs_parse, 'blood_pressure'].astype(str).str.extract(BLOOD_PRESSURE_PATTERN, expand=True)
+        systolic = systolic.astype('float64')
+        diastolic = diastolic.astype('float64')
+        systolic[needs_parse] = pd.to_numeric(bp_split[0], errors='coerce')
+        diastolic[needs_parse] = pd.to_numeric(bp_split[1], errors='coerce')
+    return systolic, diastolic
+
+# Vitals held in the cached frames; see compact_records
+VITAL_COLUMNS = ['systolic', 'diastolic', 'sugar_level', 'pulse_rate']
+
+def reading_value(value):
+    # One reading of a single record as a float, or None when it is missing
+    # or not a number
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+def _compact_number(values):
+    # Whole-number readings are held as int16, or float32 when some are
+    # missing; both hold them exactly in a quarter or half of float64's
+    # space. Columns with fractional values are left as float64.
+    values = pd.to_numeric(values, errors='coerce')
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        values = values.astype('float64')
+    present = values.dropna()
+    if not ((present % 1 == 0).all() and present.between(-32768, 32767).all()):
+        return values
+    if len(present) == len(values):
+        return values.astype('int16')
+    return values.astype('float32')
+
+def compact_records(df):
+    # Splits page-shaped records into (records, notes) for caching: records
+    # without the notes column, with small numeric dtypes and blood_pressure
+    # as a categorical, and notes as a Series of the rows that have one,
+    # indexed like records
+    if df.empty:
+        return df, pd.Series(dtype=object)
+    notes = df['notes']
+    records = df.drop(columns='notes')
+    for column in VITAL_COLUMNS:
+        records[column] = _compact_number(records[column])
+    records['blood_pressure'] = records['blood_pressure'].astype('category')
+    return records, notes[notes.notna()]
+
+def slice_dates(df, start=None, end=None):
+    # Rows with start <= date < end of records sorted by date (either bound
+    # may be None). Binary search on the dates finds one positional slice, so
+    # the cost follows the size of the result rather than of the history.
+    if df.empty:
+        return df
+    first = df['date'].searchsorted(start) if start is not None else 0
+    last = df['date'].searchsorted(end) if end is not None else len(df)
+    return df.iloc[first:last]
+
+def attach_notes(df, notes):
+    # Adds the notes column back to (a slice of) compacted records, for display
+    with_notes = df.assign(notes=notes.reindex(df.index))
+    return with_notes[[column for column in RECORD_COLUMNS if column in with_notes]]
+
+def to_typed(df):
+    # Converts page-shaped records into the typed layout
+    if df.empty:
+        return pd.DataFrame({
+            'timestamp': pd.Series(dtype='datetime64[ns]'),
+            'systolic': pd.Series(dtype='Int16'),
+            'diastolic': pd.Series(dtype='Int16'),
+            'sugar': pd.Series(dtype='Float32'),
+            'pulse': pd.Series(dtype='Int16'),
+            'notes': pd.Series(dtype='string'),
+        })
+    systolic, diastolic = backfill_blood_pressure(df)
+    notes = df['notes'].astype('string')
+    typed = pd.DataFrame({
+        # The typed stores keep timestamps to the millisecond
+        'timestamp': pd.to_datetime(df['date'], errors='coerce').dt.floor('ms'),
+        'systolic': systolic.round().astype('Int16'),
+        'diastolic': diastolic.round().astype('Int16'),
+        'sugar': pd.to_numeric(df['sugar_level'], errors='coerce').astype('Float32'),
+        'pulse': pd.to_numeric(df['pulse_rate'], errors='coerce').round().astype('Int16'),
+        'notes': notes.mask(notes == ''),
+    })
+    return typed.dropna(subset=['timestamp'])
+
+def _as_csv_number(series):
+    # Mirror what pd.read_csv would produce: int64 without gaps, float64 otherwise
+    values = series.astype('float64')
+    if values.notna().all() and (values % 1 == 0).all():
+        return values.astype('int64')
+    return values
+
+def from_typed(typed):
+    # Converts typed records back into the frame layout the pages expect
+    if typed.empty:
+        return pd.DataFrame()
+    has_bp = typed['systolic'].notna() & typed['diastolic'].notna()
+    blood_pressure = (typed['systolic'].astype(str) + '/' + typed['diastolic'].astype(str)).astype(object).where(has_bp)
+    return pd.DataFrame({
+        'date': typed['timestamp'].astype('datetime64[ns]'),
+        'blood_pressure': blood_pressure,
+        'sugar_level': _as_csv_number(typed['sugar']),
+        'pulse_rate': _as_csv_number(typed['pulse']),
+        'notes': typed['notes'].astype(object).where(typed['notes'].notna()),
+        'systolic': _as_csv_number(typed['systolic']),
+        'diastolic': _as_csv_number(typed['diastolic']),
+    })
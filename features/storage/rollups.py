@@ -0,0 +1,124 @@
+import math
+from datetime import timedelta
+
+import pandas as pd
+
+from features.storage.records import reading_value
+
+# Per-user aggregates of every metric by day, ISO week and month. Each period
+# holds the number of records plus, per metric, [count, sum, min, max, histogram]
+# where the histogram maps whole-number values to counts and serves as the
+# median sketch. Periods merge by adding counts, so any range of periods can be
+# summarized without touching the raw readings.
+METRICS = ['sugar_level', 'pulse_rate', 'systolic', 'diastolic']
+GRANULARITIES = ['day', 'week', 'month']
+
+def period_key(granularity, timestamp):
+    if granularity == 'day':
+        return timestamp.strftime('%Y-%m-%d')
+    if granularity == 'week':
+        # Weeks are keyed by their Monday
+        return (timestamp - timedelta(days=timestamp.weekday())).strftime('%Y-%m-%d')
+    return timestamp.strftime('%Y-%m')
+
+def empty_rollups(version=None):
+    rollups = {granularity: {} for granularity in GRANULARITIES}
+    rollups['version'] = version
+    return rollups
+
+def build_rollups(df, version=None):
+    # Rebuilds all rollups from raw records with one group-by per granularity
+    rollups = empty_rollups(version)
+    if df.empty:
+        return rollups
+    keys = {
+        'day': df['date'].dt.strftime('%Y-%m-%d'),
+        'week': (df['date'] - pd.to_timedelta(df['date'].dt.weekday, unit='D')).dt.strftime('%Y-%m-%d'),
+        'month': df['date'].dt.strftime('%Y-%m'),
+    }
+    for granularity, key in keys.items():
+        periods = rollups[granularity]
+        for period, records in key.value_counts().items():
+            periods[period] = {'records': int(records)}
+        for metric in METRICS:
+            # Summed in float64; the cached frames may hold float32
+            values = pd.to_numeric(df[metric], errors='coerce').astype('float64')
+            valid = values.notna()
+            if not valid.any():
+                continue
+            values, metric_key = values[valid], key[valid]
+            aggregates = values.groupby(metric_key).agg(['count', 'sum', 'min', 'max'])
+            for period, count, total, low, high in aggregates.itertuples(name=None):
+                periods[period][metric] = [int(count), float(total), float(low), float(high), {}]
+            buckets = values.round().astype('int64')
+            histogram = buckets.groupby([metric_key, buckets]).size()
+            for (period, value), count in histogram.items():
+                periods[period][metric][4][str(value)] = int(count)
+    return rollups
+
+def add_record(rollups, record):
+    # Folds one saved record into every granularity, touching three periods
+    timestamp = pd.Timestamp(record['date'])
+    for granularity in GRANULARITIES:
+        entry = rollups[granularity].setdefault(period_key(granularity, timestamp), {'records': 0})
+        entry['records'] += 1
+        for metric in METRICS:
+            value = reading_value(record.get(metric))
+            if value is None:
+                continue
+            stats = entry.get(metric)
+            if stats is None:
+                entry[metric] = [1, value, value, value, {str(round(value)): 1}]
+                continue
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = min(stats[2], value)
+            stats[3] = max(stats[3], value)
+            bucket = str(round(value))
+            stats[4][bucket] = stats[4].get(bucket, 0) + 1
+
+def _histogram_median(histogram, count):
+    # Same definition as pandas: the middle value, or the mean of the two middle values
+    lower_rank, upper_rank = (count - 1) // 2, count // 2
+    lower = None
+    seen = 0
+    for value, n in sorted((float(value), n) for value, n in histogram.items()):
+        if lower is None and seen + n > lower_rank:
+            lower = value
+        if seen + n > upper_rank:
+            return (lower + value) / 2
+        seen += n
+    return lower
+
+def summarize(rollups, granularity, start_key=None, end_key=None):
+    # Merges the periods between start_key and end_key (inclusive) into
+    # {'records': n, metric: {'count', 'mean', 'median', 'min', 'max'}}
+    records = 0
+    merged = {metric: [0, 0.0, math.inf, -math.inf, {}] for metric in METRICS}
+    for period, entry in rollups[granularity].items():
+        if (start_key is not None and period < start_key) or (end_key is not None and period > end_key):
+            continue
+        records += entry['records']
+        for metric in METRICS:
+            stats = entry.get(metric)
+            if stats is None:
+                continue
+            total = merged[metric]
+            total[0] += stats[0]
+            total[1] += stats[1]
+            total[2] = min(total[2], stats[2])
+            total[3] = max(total[3], stats[3])
+            for value, n in stats[4].items():
+                total[4][value] = total[4].get(value, 0) + n
+
+    summary = {'records': records}
+    for metric, (count, total, low, high, histogram) in merged.items():
+        if count:
+            summary[metric] = {
+                'count': count,
+                'mean': total / count,
+                'median': _histogram_median(histogram, count),
+                'min': low,
+                'max': high,
+            }
+    return summary
@@ -0,0 +1,138 @@
+import os
+
+import pandas as pd
+
+from features.storage.backend import StorageBackend
+from features.storage.paths import DATA_DIR
+from features.storage.pool import ConnectionPool
+from features.storage.records import TYPED_COLUMNS, from_typed, to_typed
+
+DEFAULT_DATABASE_PATH = os.path.join(DATA_DIR, "health_records.db")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    username TEXT NOT NULL,
+    timestamp INTEGER NOT NULL, -- milliseconds since the epoch
+    systolic INTEGER,
+    diastolic INTEGER,
+    sugar REAL,
+    pulse INTEGER,
+    notes TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_username_timestamp ON records (username, timestamp);
+CREATE TABLE IF NOT EXISTS data_versions (
+    username TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+def _to_millis(timestamp):
+    return int(pd.Timestamp(timestamp).value // 1_000_000)
+
+class SqliteBackend(StorageBackend):
+    # All users in one SQLite database indexed on (username, timestamp), so a
+    # date range query reads only the rows inside the range
+
+    name = 'sqlite'
+    pushes_down_ranges = True
+
+    def __init__(self, path=DEFAULT_DATABASE_PATH, pool_size=8):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.pool = ConnectionPool(path, SCHEMA, size=pool_size)
+
+    def version(self, username):
+        with self.pool.connection() as connection:
+            row = connection.execute("SELECT version FROM data_versions WHERE username = ?", (username,)).fetchone()
+        return row[0] if row else None
+
+    def date_bounds(self, username):
+        with self.pool.connection() as connection:
+            row = connection.execute(
+                "SELECT MIN(timestamp), MAX(timestamp) FROM records WHERE username = ?", (username,)
+            ).fetchone()
+        if row[0] is None:
+            return None
+        return pd.Timestamp(row[0], unit='ms'), pd.Timestamp(row[1], unit='ms')
+
+    def _range_query(self, username, start=None, end=None):
+        query = "SELECT timestamp, systolic, diastolic, sugar, pulse, notes FROM records WHERE username = ?"
+        params = [username]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(_to_millis(start))
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(_to_millis(end))
+        query += " ORDER BY timestamp, id"
+        return query, params
+
+    def read_typed(self, username, start=None, end=None):
+        query, params = self._range_query(username, start, end)
+        with self.pool.connection() as connection:
+            rows = pd.read_sql_query(query, connection, params=params)
+        return self._typed_rows(rows)
+
+    def iter_chunks(self, username, start=None, end=None, chunk_size=5000):
+        query, params = self._range_query(username, start, end)
+        with self.pool.connection() as connection:
+            for rows in pd.read_sql_query(query, connection, params=params, chunksize=chunk_size):
+                yield from_typed(self._typed_rows(rows))
+
+    def _typed_rows(self, rows):
+        if rows.empty:
+            return to_typed(pd.DataFrame())
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(rows['timestamp'], unit='ms'),
+            'systolic': rows['systolic'].astype('Int16'),
+            'diastolic': rows['diastolic'].astype('Int16'),
+            'sugar': rows['sugar'].astype('Float32'),
+            'pulse': rows['pulse'].astype('Int16'),
+            'notes': rows['notes'].astype('string'),
+        })
+
+    def read(self, username, start=None, end=None):
+        return from_typed(self.read_typed(username, start, end))
+
+    def read_last(self, username, count):
+        # Walks the (username, timestamp) index backwards and stops after count rows
+        query = ("SELECT timestamp, systolic, diastolic, sugar, pulse, notes FROM records WHERE username = ?"
+                 " ORDER BY timestamp DESC, id DESC LIMIT ?")
+        with self.pool.connection() as connection:
+            rows = pd.read_sql_query(query, connection, params=[username, count])
+        return from_typed(self._typed_rows(rows.iloc[::-1].reset_index(drop=True)))
+
+    def append(self, username, record):
+        self.write_typed(username, to_typed(pd.DataFrame([record])))
+
+    def append_many(self, username, df):
+        self.write_typed(username, to_typed(df))
+
+    def write_typed(self, username, typed, replace=False):
+        # Inserts the records and bumps the user's data version in one transaction
+        typed = typed[TYPED_COLUMNS]
+        rows = [
+            (
+                username,
+                _to_millis(timestamp),
+                None if pd.isna(systolic) else int(systolic),
+                None if pd.isna(diastolic) else int(diastolic),
+                None if pd.isna(sugar) else float(sugar),
+                None if pd.isna(pulse) else int(pulse),
+                None if pd.isna(notes) else str(notes),
+            )
+            for timestamp, systolic, diastolic, sugar, pulse, notes in typed.itertuples(index=False, name=None)
+        ]
+        with self.pool.connection() as connection:
+            with connection:
+                if replace:
+                    connection.execute("DELETE FROM records WHERE username = ?", (username,))
+                connection.executemany(
+                    "INSERT INTO records (username, timestamp, systolic, diastolic, sugar, pulse, notes) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                connection.execute(
+                    "INSERT INTO data_versions (username, version) VALUES (?, 1) "
+                    "ON CONFLICT(username) DO UPDATE SET version = version + 1",
+                    (username,)
+                )
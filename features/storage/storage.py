@@ -0,0 +1,350 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+import pandas as pd
+
+from features.storage import flags, rollups, trends
+from features.storage.atomic import write_durably
+from features.storage.csv_backend import CsvBackend
+from features.storage.locks import user_lock
+from features.storage.parquet_backend import ParquetBackend
+from features.storage.paths import get_user_data_dir
+from features.storage.records import VITAL_COLUMNS, attach_notes, compact_records, reading_value, slice_dates
+from features.storage.sqlite_backend import SqliteBackend
+from features.storage.versions import bump_version, read_version
+from features.telemetry.telemetry import span
+from features.thresholds.thresholds import thresholds_tag
+
+# Record stores selectable with `storage: backend:` in config.yaml
+BACKENDS = {
+    'csv': CsvBackend,
+    'parquet': ParquetBackend,
+    'sqlite': SqliteBackend,
+}
+
+# Parsed record frames are shared by every page and session in this process.
+# Entries are keyed on the backend's data version so a rerun with unchanged
+# data never touches storage, and the least recently used frames go first.
+MAX_CACHED_FRAMES = 64
+
+# Indexes derived from each user's records and kept next to them as
+# name: (file, build(df, tag), add_record(index, record)). add_record may
+# return False for a record it can't fold in; the index is then rebuilt on
+# its next read.
+DERIVED_INDEXES = {
+    'rollups': ("rollups.json", rollups.build_rollups, rollups.add_record),
+    'flags': ("flags.json", flags.build_flags, flags.add_record),
+    'trends': ("trends.json", trends.build_trends, trends.add_record),
+}
+
+# Each index file is a snapshot with a log next to it (rollups.log.jsonl)
+# of the records saved since, one JSON line per record with the index's tag
+# after it. A save appends a line instead of rewriting the snapshot, so it
+# costs the same however long the history is. The log starts with a line
+# naming the snapshot's tag; reads replay the lines after it, and fold the
+# log into a new snapshot once it reaches this size.
+INDEX_LOG_BYTES = 64 * 1024
+
+# Enough of the end of a log to hold its last line
+INDEX_LOG_TAIL_BYTES = 4096
+
+_backend = None
+_backend_options = {}
+_backend_lock = threading.Lock()
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+def configure_storage(options=None):
+    global _backend, _backend_options
+    options = options or {}
+    backend_name = options.get('backend', 'csv')
+    if backend_name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend '{backend_name}'. Choose one of: {', '.join(BACKENDS)}")
+    with _backend_lock:
+        # main.py runs on every Streamlit rerun; keep the live backend if it is unchanged
+        if _backend is not None and _backend.name == backend_name:
+            return _backend
+        backend_options = {key: value for key, value in options.items() if key != 'backend'}
+        _backend = BACKENDS[backend_name](**backend_options)
+        _backend_options = dict(options)
+    with _cache_lock:
+        _cache.clear()
+    return _backend
+
+def get_storage_options():
+    # The options storage was configured with, for setting up worker processes
+    with _backend_lock:
+        return dict(_backend_options)
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = CsvBackend()
+        return _backend
+
+def get_data_version(username):
+    # The version every cache of the user's data is keyed on: the shared
+    # change counter (see versions.py), which any app process sharing the
+    # data directory bumps when it saves. Users whose records have never been
+    # saved through here fall back to the backend's own version.
+    version = read_version(username)
+    if version is None:
+        return get_backend().version(username)
+    return version
+
+def _date_bounds(start_date, end_date):
+    # Inclusive calendar dates become a half-open [start, end) timestamp range
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) + timedelta(days=1) if end_date is not None else None
+    return start, end
+
+def _cached_read(key, version, read):
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is not None and entry[0] == version:
+            _cache.move_to_end(key)
+            return entry[1]
+
+    df = read()
+
+    with _cache_lock:
+        _cache[key] = (version, df)
+        _cache.move_to_end(key)
+        while len(_cache) > MAX_CACHED_FRAMES:
+            _cache.popitem(last=False)
+    return df
+
+def _read_records(backend, username, start=None, end=None):
+    with span("storage.read") as timing:
+        df = backend.read(username, start, end)
+        timing.rows = len(df)
+    return compact_records(df)
+
+def _load(username, start_date, end_date):
+    # (records, notes) for the range; see compact_records
+    backend = get_backend()
+    version = get_data_version(username)
+    start, end = _date_bounds(start_date, end_date)
+
+    if backend.pushes_down_ranges or (start is None and end is None):
+        return _cached_read((username, start, end), version, lambda: _read_records(backend, username, start, end))
+
+    df, notes = _cached_read((username, None, None), version, lambda: _read_records(backend, username))
+    return slice_dates(df, start, end), notes
+
+def load_data(username, start_date=None, end_date=None):
+    # Returns the user's records sorted by date, optionally limited to the
+    # inclusive start_date..end_date range. The frame holds compact dtypes and
+    # no notes column (see load_data_with_notes). It is cached and shared, so
+    # treat it as read-only: derive new frames or series from it instead of
+    # assigning columns.
+    return _load(username, start_date, end_date)[0]
+
+def load_data_with_notes(username, start_date=None, end_date=None):
+    # (records, notes) for pages that show notes: records as from load_data,
+    # and the notes to join onto the rows actually displayed with attach_notes
+    return _load(username, start_date, end_date)
+
+def load_last_readings(username, count):
+    # The user's latest `count` records, in date order
+    backend = get_backend()
+    if not backend.pushes_down_ranges:
+        df = load_data(username)
+        return df.iloc[max(len(df) - count, 0):]
+    version = get_data_version(username)
+    return _cached_read((username, 'last', count), version, lambda: compact_records(backend.read_last(username, count)))[0]
+
+def iter_records(username, start_date=None, end_date=None, chunk_size=5000):
+    # Yields the user's records, notes included, in date order as frames of
+    # at most chunk_size rows, so long ranges can be processed without
+    # materializing them at once
+    backend = get_backend()
+    start, end = _date_bounds(start_date, end_date)
+    if backend.pushes_down_ranges:
+        yield from backend.iter_chunks(username, start, end, chunk_size)
+        return
+    df, notes = load_data_with_notes(username, start_date, end_date)
+    for offset in range(0, len(df), chunk_size):
+        yield attach_notes(df.iloc[offset:offset + chunk_size], notes)
+
+def get_date_bounds(username):
+    # (first, last) record timestamps for the date pickers, or None without records
+    backend = get_backend()
+    if backend.pushes_down_ranges:
+        version = get_data_version(username)
+        return _cached_read((username, 'bounds', None), version, lambda: backend.date_bounds(username))
+    df = load_data(username)
+    if df.empty:
+        return None
+    return df['date'].iloc[0], df['date'].iloc[-1]
+
+def _index_tags(version):
+    # Tag each derived index is stored with; it must change whenever the index would
+    return {
+        'rollups': repr(version),
+        'flags': f"{version!r}@{thresholds_tag()}",
+        'trends': repr(version),
+    }
+
+def _index_path(username, name):
+    return os.path.join(get_user_data_dir(username), DERIVED_INDEXES[name][0])
+
+def _index_log_path(username, name):
+    return os.path.splitext(_index_path(username, name))[0] + ".log.jsonl"
+
+def _read_index(username, name):
+    try:
+        with open(_index_path(username, name), encoding='utf-8') as index_file:
+            return json.load(index_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def _write_index(username, name, index):
+    # Writes a snapshot and starts its log afresh. The snapshot goes first:
+    # a reader that sees the new snapshot with the old log finds the
+    # snapshot's tag in it and replays only what follows.
+    write_durably(_index_path(username, name), lambda index_file: json.dump(index, index_file))
+    header = json.dumps({'version': index['version']}) + "\n"
+    write_durably(_index_log_path(username, name), lambda log_file: log_file.write(header))
+
+def _log_lines(log_bytes):
+    # Complete lines only; a save may be appending the last one
+    return [json.loads(line) for line in log_bytes[:log_bytes.rfind(b"\n") + 1].splitlines()]
+
+def _last_logged_tag(username, name):
+    # The index's tag after its last logged record, read from the end of the log
+    try:
+        with open(_index_log_path(username, name), 'rb') as log_file:
+            log_file.seek(0, os.SEEK_END)
+            log_file.seek(max(log_file.tell() - INDEX_LOG_TAIL_BYTES, 0))
+            tail = log_file.read()
+    except FileNotFoundError:
+        return None
+    lines = tail.splitlines()
+    try:
+        return json.loads(lines[-1])['version'] if tail.endswith(b"\n") else None
+    except (IndexError, KeyError, ValueError):
+        return None
+
+def _load_index(username, name):
+    # (index, log size): the snapshot with the records logged after it folded
+    # in, or None when the two don't fit together or a record can't be folded
+    try:
+        # The log is read first; see _write_index
+        with open(_index_log_path(username, name), 'rb') as log_file:
+            log_bytes = log_file.read()
+        lines = _log_lines(log_bytes)
+    except (FileNotFoundError, ValueError):
+        return None, 0
+    index = _read_index(username, name)
+    if index is None:
+        return None, 0
+    positions = [position for position, line in enumerate(lines) if line.get('version') == index['version']]
+    if not positions:
+        return None, 0
+    add_record = DERIVED_INDEXES[name][2]
+    for line in lines[positions[-1] + 1:]:
+        if add_record(index, line['record']) is False:
+            return None, 0
+        index['version'] = line['version']
+    return index, len(log_bytes)
+
+def _logged_record(record):
+    # The fields of a record the derived indexes use, as JSON values
+    logged = {'date': pd.Timestamp(record['date']).strftime(flags.TIMESTAMP_FORMAT)}
+    for column in VITAL_COLUMNS:
+        logged[column] = reading_value(record.get(column))
+    return logged
+
+def rebuild_index(username, name):
+    # Recomputes a derived index from the raw records
+    with user_lock(get_user_data_dir(username)):
+        # Reading may create the user's files, so take the version afterwards
+        df = load_data(username)
+        with span(f"storage.rebuild_{name}", rows=len(df)):
+            index = DERIVED_INDEXES[name][1](df, _index_tags(get_data_version(username))[name])
+            _write_index(username, name, index)
+    return index
+
+def _get_index(username, name):
+    # Derived indexes are maintained on every save. A store written some other
+    # way (a migration, another backend) or a change of healthy ranges leaves
+    # an index behind its tag, and it is rebuilt once here.
+    tag = _index_tags(get_data_version(username))[name]
+
+    def read():
+        index, log_size = _load_index(username, name)
+        if index is not None and index['version'] == tag and log_size < INDEX_LOG_BYTES:
+            return index
+        # Rebuilding, or folding the log into the snapshot, happens under the
+        # lock so no save is appending meanwhile
+        with user_lock(get_user_data_dir(username)):
+            index, log_size = _load_index(username, name)
+            if index is None or index['version'] != tag:
+                return rebuild_index(username, name)
+            if log_size >= INDEX_LOG_BYTES:
+                with span(f"storage.compact_{name}"):
+                    _write_index(username, name, index)
+            return index
+    return _cached_read((username, name, None), tag, read)
+
+def get_rollups(username):
+    return _get_index(username, 'rollups')
+
+def summarize_records(username, granularity='day', start_date=None, end_date=None):
+    # Count, mean, median, min and max per metric over the inclusive date range,
+    # answered from the rollups without reading raw records. With 'week' or
+    # 'month' the range is widened to whole periods.
+    start_key = rollups.period_key(granularity, pd.Timestamp(start_date)) if start_date is not None else None
+    end_key = rollups.period_key(granularity, pd.Timestamp(end_date)) if end_date is not None else None
+    return rollups.summarize(get_rollups(username), granularity, start_key, end_key)
+
+def get_flags(username):
+    # The raw flag index; see flags.py for its layout
+    return _get_index(username, 'flags')
+
+def get_flagged_records(username, metric=None):
+    # Records with an out-of-range reading (on metric, if given), from the flag index
+    return flags.flagged_frame(_get_index(username, 'flags'), metric)
+
+def get_trends(username):
+    # The trend index (rolling means, EWMA baselines and anomalies); see trends.py
+    return _get_index(username, 'trends')
+
+def append_record(username, record):
+    backend = get_backend()
+    with user_lock(get_user_data_dir(username)):
+        tags = _index_tags(get_data_version(username))
+        backend.append(username, record)
+        new_tags = _index_tags(bump_version(username))
+        # Log the record for each index only if it was current before the
+        # save; otherwise the next read rebuilds it
+        logged = _logged_record(record)
+        for name in DERIVED_INDEXES:
+            if _last_logged_tag(username, name) == tags[name]:
+                line = json.dumps({'version': new_tags[name], 'record': logged}) + "\n"
+                with open(_index_log_path(username, name), 'a', encoding='utf-8') as log_file:
+                    log_file.write(line)
+
+def append_records(username, df):
+    # Writes a batch of records in one backend write. The derived indexes are
+    # left behind the new data version and rebuilt in one pass on their next read.
+    with user_lock(get_user_data_dir(username)):
+        get_backend().append_many(username, df)
+        bump_version(username)
+
+def invalidate(username, everywhere=False):
+    # Drops this process's cached frames for the user. With everywhere=True
+    # the shared counter is bumped too, so every process re-reads; use that
+    # after changing a user's files outside the storage functions.
+    if everywhere:
+        with user_lock(get_user_data_dir(username)):
+            bump_version(username)
+    with _cache_lock:
+        for key in [key for key in _cache if key[0] == username]:
+            del _cache[key]
@@ -0,0 +1,153 @@
+import bisect
+import math
+
+import numpy as np
+import pandas as pd
+
+from features.storage.flags import TIMESTAMP_FORMAT
+from features.storage.records import reading_value
+
+# Per-user trend state, folded forward one reading at a time as records are
+# saved. For each metric it keeps an exponentially weighted mean and mean of
+# squares (the user's own baseline and its spread) and the last few readings
+# (the short-term rolling mean). A reading whose z-score against the baseline
+# before it reaches ANOMALY_Z is recorded as an anomaly. The index holds:
+#   'last': timestamp of the latest folded record
+#   'state': {metric: {'count', 'ewma', 'ewm_square', 'window'}}
+#   'days': {day: {metric: [rolling mean, ewma, ewm std]}} as of the day's last reading
+#   'anomalies': date-sorted [timestamp, metric, value, z, baseline]
+# build_trends computes the same values with vectorized pandas operations.
+TREND_METRICS = ['sugar_level', 'pulse_rate', 'systolic', 'diastolic']
+
+# Readings in the short-term rolling mean
+ROLLING_WINDOW = 7
+
+# Span of the baseline EWMA in readings
+EWMA_SPAN = 30
+EWMA_ALPHA = 2 / (EWMA_SPAN + 1)
+
+# Readings needed before the baseline is trusted, the smallest spread a
+# z-score is taken against (readings are whole numbers) and the |z| that
+# counts as an anomaly
+MIN_BASELINE_READINGS = 10
+MIN_STD = 1.0
+ANOMALY_Z = 3.0
+
+def empty_trends(version=None):
+    return {'version': version, 'last': None, 'state': {}, 'days': {}, 'anomalies': []}
+
+def _std(ewma, ewm_square):
+    return math.sqrt(max(ewm_square - ewma * ewma, 0.0))
+
+def build_trends(df, version=None):
+    trends = empty_trends(version)
+    if df.empty:
+        return trends
+    trends['last'] = df['date'].iloc[-1].strftime(TIMESTAMP_FORMAT)
+    anomalies = []
+    for metric in TREND_METRICS:
+        values = pd.to_numeric(df[metric], errors='coerce').astype('float64')
+        valid = values.notna().to_numpy()
+        if not valid.any():
+            continue
+        dates = df['date'][valid].reset_index(drop=True)
+        values = values[valid].reset_index(drop=True)
+
+        ewma = values.ewm(alpha=EWMA_ALPHA, adjust=False).mean()
+        ewm_square = (values * values).ewm(alpha=EWMA_ALPHA, adjust=False).mean()
+        std = np.sqrt((ewm_square - ewma * ewma).clip(lower=0))
+        rolling = values.rolling(ROLLING_WINDOW, min_periods=1).mean()
+
+        # Each reading is scored against the baseline before it
+        baseline = ewma.shift()
+        z = (values - baseline) / std.shift().clip(lower=MIN_STD)
+        anomalous = (values.index >= MIN_BASELINE_READINGS) & (z.abs() >= ANOMALY_Z).to_numpy()
+        if anomalous.any():
+            timestamps = dates[anomalous].dt.strftime(TIMESTAMP_FORMAT).tolist()
+            anomalies.extend(
+                [timestamp, metric, value, round(score, 2), round(before, 2)]
+                for timestamp, value, score, before in zip(timestamps, values[anomalous].tolist(), z[anomalous].tolist(), baseline[anomalous].tolist())
+            )
+
+        trends['state'][metric] = {
+            'count': len(values),
+            'ewma': float(ewma.iloc[-1]),
+            'ewm_square': float(ewm_square.iloc[-1]),
+            'window': values.iloc[-ROLLING_WINDOW:].tolist(),
+        }
+        daily = pd.DataFrame({'rolling': rolling, 'ewma': ewma, 'std': std}).groupby(dates.dt.strftime('%Y-%m-%d').to_numpy()).last()
+        for day, rolling_mean, day_ewma, day_std in daily.itertuples(name=None):
+            trends['days'].setdefault(day, {})[metric] = [round(rolling_mean, 2), round(day_ewma, 2), round(day_std, 2)]
+
+    # Stable, so readings of one record stay in metric order
+    anomalies.sort(key=lambda entry: entry[0])
+    trends['anomalies'] = anomalies
+    trends['days'] = dict(sorted(trends['days'].items()))
+    return trends
+
+def add_record(trends, record):
+    # Folds one saved record into the state in constant time. A record dated
+    # before the latest folded one would change every value after it, so it
+    # isn't folded: returns False and the index is rebuilt on its next read.
+    timestamp = pd.Timestamp(record['date']).strftime(TIMESTAMP_FORMAT)
+    if trends['last'] is not None and timestamp < trends['last']:
+        return False
+    trends['last'] = timestamp
+    day = timestamp[:10]
+    for metric in TREND_METRICS:
+        value = reading_value(record.get(metric))
+        if value is None:
+            continue
+        state = trends['state'].get(metric)
+        if state is None:
+            state = trends['state'][metric] = {'count': 0, 'ewma': value, 'ewm_square': value * value, 'window': []}
+        elif state['count'] >= MIN_BASELINE_READINGS:
+            z = (value - state['ewma']) / max(_std(state['ewma'], state['ewm_square']), MIN_STD)
+            if abs(z) >= ANOMALY_Z:
+                trends['anomalies'].append([timestamp, metric, value, round(z, 2), round(state['ewma'], 2)])
+        if state['count']:
+            state['ewma'] = (1 - EWMA_ALPHA) * state['ewma'] + EWMA_ALPHA * value
+            state['ewm_square'] = (1 - EWMA_ALPHA) * state['ewm_square'] + EWMA_ALPHA * value * value
+        state['count'] += 1
+        state['window'] = (state['window'] + [value])[-ROLLING_WINDOW:]
+        rolling_mean = sum(state['window']) / len(state['window'])
+        trends['days'].setdefault(day, {})[metric] = [
+            round(rolling_mean, 2), round(state['ewma'], 2), round(_std(state['ewma'], state['ewm_square']), 2),
+        ]
+    return True
+
+def current_trends(trends):
+    # {metric: {'count', 'rolling_mean', 'ewma', 'std'}} after the latest reading
+    return {
+        metric: {
+            'count': state['count'],
+            'rolling_mean': sum(state['window']) / len(state['window']),
+            'ewma': state['ewma'],
+            'std': _std(state['ewma'], state['ewm_square']),
+        }
+        for metric, state in trends['state'].items()
+    }
+
+def baseline_frame(trends, metric, start=None, end=None):
+    # Daily rolling mean, EWMA and spread of metric for the days between the
+    # start and end timestamps (inclusive), for chart overlays
+    start_key = start.strftime('%Y-%m-%d') if start is not None else None
+    end_key = end.strftime('%Y-%m-%d') if end is not None else None
+    rows = [
+        (day, *values[metric]) for day, values in trends['days'].items()
+        if metric in values and (start_key is None or day >= start_key) and (end_key is None or day <= end_key)
+    ]
+    df = pd.DataFrame(rows, columns=['date', 'rolling_mean', 'ewma', 'std'])
+    df['date'] = pd.to_datetime(df['date'], format='%Y-%m-%d')
+    return df
+
+def anomaly_frame(trends, start=None, end=None, metrics=None):
+    # Anomalous readings with start <= date <= end, optionally only for metrics
+    entries = trends['anomalies']
+    first = 0 if start is None else bisect.bisect_left(entries, start.strftime(TIMESTAMP_FORMAT), key=lambda entry: entry[0])
+    last = len(entries) if end is None else bisect.bisect_right(entries, end.strftime(TIMESTAMP_FORMAT), key=lambda entry: entry[0])
+    df = pd.DataFrame(entries[first:last], columns=['date', 'metric', 'value', 'z', 'baseline'])
+    df['date'] = pd.to_datetime(df['date'], format=TIMESTAMP_FORMAT)
+    if metrics is not None:
+        df = df[df['metric'].isin(metrics)]
+    return df
@@ -0,0 +1,38 @@
+import os
+import uuid
+
+from features.storage.atomic import write_durably
+from features.storage.paths import get_user_data_dir
+
+# A per-user change counter shared by every app process using the same data
+# directory. Each save through the storage facade bumps it after the records
+# are written, and every in-memory cache of a user's data is keyed on it, so
+# a process notices another worker's save the next time it looks.
+#
+# The file holds "<epoch>:<counter>". The epoch is random and chosen when the
+# file is created, so a deleted and recreated counter never repeats a version
+# some process still has cached. The file is read rather than stat'ed:
+# opening it revalidates it on NFS, where cached attributes can lag.
+VERSION_FILE = "version"
+
+def get_version_path(username):
+    return os.path.join(get_user_data_dir(username), VERSION_FILE)
+
+def read_version(username):
+    # The user's current version, or None if nothing has bumped it yet
+    try:
+        with open(get_version_path(username), encoding='utf-8') as version_file:
+            return version_file.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def bump_version(username):
+    # Call with the user's lock held, after the new records are durable
+    current = read_version(username)
+    epoch, _, counter = (current or '').partition(':')
+    if current is None or not counter.isdigit():
+        epoch, counter = uuid.uuid4().hex[:12], '0'
+    version = f"{epoch}:{int(counter) + 1}"
+    os.makedirs(get_user_data_dir(username), exist_ok=True)
+    write_durably(get_version_path(username), lambda version_file: version_file.write(version))
+    return version
@@ -0,0 +1,159 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from features.storage.atomic import write_durably
+
+# Timing spans around the hot paths of each page, enabled with a
+# `telemetry:` section in config.yaml:
+#   telemetry:
+#     log_path: data/telemetry.log      # one JSON line per span
+#     metrics_path: data/metrics.prom   # Prometheus textfile, rewritten after each page run
+#     debug_panel: true                 # this run's timings in the sidebar
+# With none of these set, span() hands back a shared no-op and records nothing.
+
+METRIC_PREFIX = "phr"
+
+_options = {}
+_enabled = False
+_logger = logging.getLogger("phr.telemetry")
+_logger.propagate = False
+_handler = None
+
+# Span name -> [count, seconds, rows, errors] since the process started
+_totals = {}
+_totals_lock = threading.Lock()
+
+# Per-thread stack of open span names and, for the debug panel, the spans
+# finished during the current script run
+_local = threading.local()
+
+class _NoopSpan:
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    # Times the enclosed block. Set .rows inside the block to record how many
+    # records it handled.
+    __slots__ = ('name', 'rows', '_started')
+
+    def __init__(self, name, rows=None):
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self):
+        stack = getattr(_local, 'stack', None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self.name)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._started
+        stack = _local.stack
+        stack.pop()
+        # Streamlit's rerun and stop signals are not Exceptions and not failures
+        failed = exc_type is not None and issubclass(exc_type, Exception)
+        _record(self.name, seconds, self.rows, failed, stack[-1] if stack else None)
+        return False
+
+def span(name, rows=None):
+    if not _enabled:
+        return _NOOP_SPAN
+    return Span(name, rows)
+
+def configure_telemetry(options=None):
+    # main.py runs on every Streamlit rerun; only a changed section is applied
+    global _options, _enabled, _handler
+    options = dict(options or {})
+    if options == _options:
+        return
+    if _handler is not None:
+        _logger.removeHandler(_handler)
+        _handler.close()
+        _handler = None
+    if options.get('log_path'):
+        os.makedirs(os.path.dirname(options['log_path']) or '.', exist_ok=True)
+        _handler = logging.FileHandler(options['log_path'], encoding='utf-8')
+        _handler.setFormatter(logging.Formatter('%(message)s'))
+        _logger.addHandler(_handler)
+        _logger.setLevel(logging.INFO)
+    _options = options
+    _enabled = any(options.get(key) for key in ('log_path', 'metrics_path', 'debug_panel'))
+
+def _record(name, seconds, rows, failed, parent):
+    with _totals_lock:
+        totals = _totals.setdefault(name, [0, 0.0, 0, 0])
+        totals[0] += 1
+        totals[1] += seconds
+        totals[2] += rows or 0
+        totals[3] += failed
+    entry = {'span': name, 'parent': parent, 'seconds': round(seconds, 6), 'rows': rows, 'error': failed}
+    if _handler is not None:
+        _logger.info(json.dumps({'time': datetime.now().isoformat(timespec='milliseconds'), **entry}))
+    run_spans = getattr(_local, 'run_spans', None)
+    if run_spans is not None:
+        run_spans.append(entry)
+
+def metrics_text():
+    # The span totals in the Prometheus text exposition format
+    with _totals_lock:
+        totals = sorted((name, list(values)) for name, values in _totals.items())
+    series = [
+        ('span_seconds', 'summary', "Time spent in instrumented spans.",
+         [('_sum', 1), ('_count', 0)]),
+        ('span_rows_total', 'counter', "Records handled in instrumented spans.", [('', 2)]),
+        ('span_errors_total', 'counter', "Instrumented spans that raised an error.", [('', 3)]),
+    ]
+    lines = []
+    for metric, metric_type, help_text, samples in series:
+        lines.append(f"# HELP {METRIC_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_{metric} {metric_type}")
+        for suffix, position in samples:
+            for name, values in totals:
+                lines.append(f'{METRIC_PREFIX}_{metric}{suffix}{{span="{name}"}} {values[position]}')
+    return "\n".join(lines) + "\n"
+
+def write_metrics():
+    # Called once per page run; the textfile is replaced in one step so a
+    # collector never reads half of it
+    path = _options.get('metrics_path')
+    if not path:
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    write_durably(path, lambda metrics_file: metrics_file.write(metrics_text()))
+
+def start_run():
+    # Starts collecting this thread's spans for the debug panel
+    if _options.get('debug_panel'):
+        _local.run_spans = []
+
+def render_debug_panel():
+    run_spans = getattr(_local, 'run_spans', None)
+    if not _options.get('debug_panel') or run_spans is None:
+        return
+    import streamlit as st
+
+    _local.run_spans = None
+    with st.sidebar.expander("Performance"):
+        if not run_spans:
+            st.write("No spans recorded in this run.")
+            return
+        st.caption("Spans finished during this run, in completion order.")
+        st.table([{'span': entry['span'], 'ms': round(entry['seconds'] * 1000, 1),
+                   'rows': entry['rows'],
+                   'error': 'yes' if entry['error'] else ''} for entry in run_spans])
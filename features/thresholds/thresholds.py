@@ -0,0 +1,32 @@
+import hashlib
+import json
+
+# Shared health thresholds used by the Analytics outlier check and the
+# recommendation rules. Readings outside min..max are flagged as out of range;
+# recommendations only call a reading high above 'high' (defaults to 'max').
+HEALTHY_RANGES = {
+    'sugar_level': {'min': 70, 'max': 140}, # mg/dL
+    'pulse_rate': {'min': 60, 'max': 100}, # bpm
+    'systolic': {'min': 90, 'max': 120, 'high': 130}, # mmHg
+    'diastolic': {'min': 60, 'max': 80, 'high': 85} # mmHg
+}
+
+def low_threshold(metric):
+    return HEALTHY_RANGES[metric]['min']
+
+def high_threshold(metric):
+    ranges = HEALTHY_RANGES[metric]
+    return ranges.get('high', ranges['max'])
+
+def configure_thresholds(overrides=None):
+    # Applies the optional `healthy_ranges:` section of config.yaml, e.g.
+    # {'sugar_level': {'max': 180}}. HEALTHY_RANGES is updated in place so
+    # every module that imported it sees the new values.
+    for metric, ranges in (overrides or {}).items():
+        if metric not in HEALTHY_RANGES:
+            raise ValueError(f"Unknown metric '{metric}' in healthy_ranges. Choose one of: {', '.join(HEALTHY_RANGES)}")
+        HEALTHY_RANGES[metric].update(ranges)
+
+def thresholds_tag():
+    # Changes whenever any healthy range changes; stored with data derived from them
+    return hashlib.sha1(json.dumps(HEALTHY_RANGES, sort_keys=True).encode()).hexdigest()[:12]
@@ -1,5 +1,28 @@
 import streamlit as st
 import os
+import importlib
+from features.telemetry.telemetry import render_debug_panel, span, start_run, write_metrics
+
+# Sidebar pages in display order: page name -> (module, render function).
+# A page's module is imported the first time the page is shown, so the login
+# form and other pages never pay for plotly, fpdf or pandas they don't use.
+PAGES = {
+    "Introduction": ("features.introduction.introduction", "render_introduction"),
+    "Input Form": ("features.input_form.input_form", "render_input_form"),
+    "Visualization": ("features.visualization.visualization", "render_visualization"),
+    "Analytics": ("features.analytics.analytics", "render_analytics"),
+    "Reports": ("features.reports.reports", "render_reports"),
+    "Recommendations": ("features.recommendations.recommendations", "render_recommendations"),
+}
+
+# Pages shown only to users whose account has this role (stauth `roles`)
+ADMIN_ROLE = "admin"
+ADMIN_PAGES = {
+    "Cohort Analytics": ("features.cohort.cohort", "render_cohort_analytics"),
+}
+
+def is_admin():
+    return ADMIN_ROLE in (st.session_state.get("roles") or [])
 
 def render_ui():
     st.set_page_config(
@@ -15,6 +38,18 @@ def render_ui():
         st.sidebar.image(logo_path, width=100)
 
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["Introduction", "Input Form", "Visualization", "Analytics", "Reports", "Recommendations"])
+    pages = list(PAGES) + (list(ADMIN_PAGES) if is_admin() else [])
+    page = st.sidebar.radio("Go to", pages)
 
     return page
+
+def render_page(page):
+    module_name, render_function = PAGES[page] if page in PAGES else ADMIN_PAGES[page]
+    start_run()
+    try:
+        with span(f"page.{render_function.removeprefix('render_')}"):
+            getattr(importlib.import_module(module_name), render_function)()
+    finally:
+        # A failed run's timings are recorded too
+        write_metrics()
+        render_debug_panel()
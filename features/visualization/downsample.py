@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+def lttb_indices(x, y, max_points):
+    # Largest-Triangle-Three-Buckets: picks max_points positions that keep the
+    # visual shape of the series (peaks, troughs, first and last points)
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    bucket_edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, stop = bucket_edges[bucket], bucket_edges[bucket + 1]
+        # Average of the next bucket is the third corner of the triangle
+        next_start = stop
+        next_stop = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else n
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+
+        areas = np.abs(
+            (x[selected] - next_x) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (next_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[bucket + 1] = selected
+    return indices
+
+def downsample_series(df, x_col, y_col, max_points):
+    # Rows of df to plot for one series: missing values dropped, then reduced
+    # to at most max_points with LTTB
+    series_df = df[[x_col, y_col]].dropna()
+    if len(series_df) <= max_points:
+        return series_df
+    x = series_df[x_col]
+    x_values = x.to_numpy(dtype='int64') if pd.api.types.is_datetime64_any_dtype(x) else x.to_numpy(dtype='float64')
+    keep = lttb_indices(x_values, series_df[y_col].to_numpy(dtype='float64'), max_points)
+    return series_df.iloc[keep]
+
+def downsample_long(df, x_col, y_cols, max_points):
+    # Long-form frame (x, variable, value) with every column downsampled on its
+    # own, in the layout plotly express uses for wide-form y=[...] plots
+    parts = []
+    for y_col in y_cols:
+        part = downsample_series(df, x_col, y_col, max_points)
+        parts.append(pd.DataFrame({x_col: part[x_col], 'variable': y_col, 'value': part[y_col]}))
+    return pd.concat(parts, ignore_index=True)
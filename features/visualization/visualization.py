@@ -1,89 +1,189 @@
 import streamlit as st
-import pandas as pd
 import plotly.express as px
-from datetime import datetime, timedelta
-import os
+import math
+import threading
+from collections import OrderedDict
+from features.storage.records import attach_notes
+from features.storage.storage import get_data_version, get_date_bounds, get_trends, load_data_with_notes
+from features.storage.trends import ROLLING_WINDOW, anomaly_frame, baseline_frame
+from features.telemetry.telemetry import span
+from features.visualization.downsample import downsample_long, downsample_series
 
-def load_data():
-    # Get the current username from session state
-    username = st.session_state["username"]
-    
-    # Construct user-specific file path
-    user_data_dir = os.path.join("data", username)
-    file_path = os.path.join(user_data_dir, "health_records.csv")
-    
-    # Ensure the user-specific directory exists (though input_form should create it)
-    os.makedirs(user_data_dir, exist_ok=True)
-
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path)
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-            df.dropna(subset=['date'], inplace=True) # Drop rows where date could not be parsed
-            df = df.sort_values(by='date')
-            return df
-        except pd.errors.EmptyDataError:
-            st.warning("No health records found. Please add some data using the 'Input Form'.")
-            return pd.DataFrame()
+# Each series is reduced to about the chart's width in pixels before plotting,
+# so the browser payload stays bounded however long the history is
+MAX_POINTS_PER_SERIES = 1000
+
+# Above this many readings per series in the range (counted before
+# downsampling) a chart switches to WebGL rendering
+WEBGL_POINT_THRESHOLD = 1500
+
+RAW_DATA_PAGE_SIZE = 100
+
+# Built figures are shared by every session in this process, keyed on
+# (username, data version, start, end, chart, overlays), so a rerun that
+# doesn't change the records or the range reuses them. The least recently
+# used go first.
+MAX_CACHED_FIGURES = 48
+
+TREND_CHARTS = ['blood_pressure', 'sugar_level', 'pulse_rate']
+
+# Metrics plotted on each trend chart
+CHART_METRICS = {
+    'blood_pressure': ['systolic', 'diastolic'],
+    'sugar_level': ['sugar_level'],
+    'pulse_rate': ['pulse_rate'],
+}
+
+_figure_cache = OrderedDict()
+_figure_cache_lock = threading.Lock()
+
+def _render_mode(point_count):
+    return 'webgl' if point_count > WEBGL_POINT_THRESHOLD else 'auto'
+
+def render_raw_data(filtered_df, notes):
+    # Sends one page of rows to the browser instead of the whole range, with
+    # the notes joined onto just that page
+    page_count = max(1, math.ceil(len(filtered_df) / RAW_DATA_PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        if st.session_state.get("raw_data_page", 1) > page_count:
+            st.session_state["raw_data_page"] = 1
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="raw_data_page")
+    first_row = (page - 1) * RAW_DATA_PAGE_SIZE
+    last_row = min(first_row + RAW_DATA_PAGE_SIZE, len(filtered_df))
+    st.dataframe(attach_notes(filtered_df.iloc[first_row:last_row], notes))
+    st.caption(f"Showing rows {first_row + 1}-{last_row} of {len(filtered_df)} (page {page} of {page_count})")
+
+def add_trend_overlays(fig, trends, metrics, start, end):
+    # Draws each metric's daily baseline (EWMA) and rolling mean from the
+    # trend index, and marks the unusual readings, between start and end
+    prefix = len(metrics) > 1
+    if not prefix:
+        # px leaves a single series out of the legend
+        fig.data[0].update(name=metrics[0], showlegend=True)
+    for metric in metrics:
+        baseline_df = baseline_frame(trends, metric, start, end)
+        if baseline_df.empty:
+            continue
+        for column, name, dash in [('ewma', "baseline", 'dash'), ('rolling_mean', f"{ROLLING_WINDOW}-reading average", 'dot')]:
+            series_df = downsample_series(baseline_df, 'date', column, MAX_POINTS_PER_SERIES)
+            fig.add_scatter(x=series_df['date'], y=series_df[column], mode='lines', line={'dash': dash, 'width': 1.5},
+                            name=f"{metric} {name}" if prefix else name)
+    anomalies = anomaly_frame(trends, start, end, metrics)
+    if not anomalies.empty:
+        fig.add_scatter(x=anomalies['date'], y=anomalies['value'], mode='markers', name="unusual reading",
+                        marker={'symbol': 'x', 'size': 9, 'color': 'red'})
+    return fig
+
+def build_trend_figure(filtered_df, chart, trends=None):
+    # One trend chart for the records, with the trend index drawn over it if
+    # given; the blood pressure chart is None when no reading has both
+    # systolic and diastolic values
+    if chart == 'blood_pressure':
+        # Drop rows where both systolic and diastolic are NaN, as they can't be plotted
+        bp_plot_df = filtered_df.dropna(subset=['systolic', 'diastolic'])
+        if bp_plot_df.empty:
+            return None
+        bp_long_df = downsample_long(bp_plot_df, 'date', ['systolic', 'diastolic'], MAX_POINTS_PER_SERIES)
+        fig = px.line(bp_long_df, x='date', y='value', color='variable', title='Blood Pressure Trend',
+                      render_mode=_render_mode(len(bp_plot_df)))
     else:
-        # If the file doesn't exist, create an empty one with the correct headers
-        pd.DataFrame(columns=['date', 'blood_pressure', 'sugar_level', 'pulse_rate', 'notes']).to_csv(file_path, index=False)
-        st.warning("No health records file found. A new one has been created. Please add some data.")
-        return pd.DataFrame()
+        title = {'sugar_level': 'Sugar Level Trend', 'pulse_rate': 'Pulse Rate Trend'}[chart]
+        series_df = downsample_series(filtered_df, 'date', chart, MAX_POINTS_PER_SERIES)
+        fig = px.line(series_df, x='date', y=chart, title=title, render_mode=_render_mode(filtered_df[chart].count()))
 
-def render_visualization():
-    st.header("Health Data Visualization")
+    if trends is not None:
+        add_trend_overlays(fig, trends, CHART_METRICS[chart], filtered_df['date'].iloc[0], filtered_df['date'].iloc[-1])
+    return fig
 
-    df = load_data()
+def build_trend_figures(filtered_df, trends=None):
+    return {chart: build_trend_figure(filtered_df, chart, trends) for chart in TREND_CHARTS}
 
-    if not df.empty:
-        st.sidebar.subheader("Filter Data")
-        
-        min_date = df['date'].min().date()
-        max_date = df['date'].max().date()
+def get_trend_figures(username, version, start_date, end_date, filtered_df, overlays=False):
+    # The trend charts for filtered_df, which must be the user's records for
+    # start_date..end_date at data version `version`. version has to be taken
+    # before the records are read, so a figure is never filed under a newer
+    # version than the data it was built from. Cached figures are shared, so
+    # don't modify them.
+    figures = {}
+    trends = None
+    for chart in TREND_CHARTS:
+        key = (username, version, start_date, end_date, chart, overlays)
+        with _figure_cache_lock:
+            if key in _figure_cache:
+                _figure_cache.move_to_end(key)
+                figures[chart] = _figure_cache[key]
+                continue
 
-        start_date = st.sidebar.date_input("Start Date", min_value=min_date, max_value=max_date, value=min_date)
-        end_date = st.sidebar.date_input("End Date", min_value=min_date, max_value=max_date, value=max_date)
+        if overlays and trends is None:
+            trends = get_trends(username)
+        figures[chart] = build_trend_figure(filtered_df, chart, trends)
 
-        filtered_df = df[(df['date'].dt.date >= start_date) & (df['date'].dt.date <= end_date)]
+        with _figure_cache_lock:
+            _figure_cache[key] = figures[chart]
+            _figure_cache.move_to_end(key)
+            while len(_figure_cache) > MAX_CACHED_FIGURES:
+                _figure_cache.popitem(last=False)
+    return figures
 
-        if filtered_df.empty:
-            st.warning("No data available for the selected date range.")
-            return
+@st.fragment
+def render_filtered_trends(username, date_bounds):
+    # Changing the date range or the raw data page reruns only this section.
+    # Fragments can't draw into the sidebar, so the filters sit above the charts.
+    st.subheader("Filter Data")
 
-        st.subheader("Trends Over Time")
+    min_date = date_bounds[0].date()
+    max_date = date_bounds[1].date()
 
+    start_column, end_column = st.columns(2)
+    start_date = start_column.date_input("Start Date", min_value=min_date, max_value=max_date, value=min_date)
+    end_date = end_column.date_input("End Date", min_value=min_date, max_value=max_date, value=max_date)
+    overlays = st.checkbox("Show baselines and unusual readings", value=True,
+                           help=f"Your usual level (EWMA), the {ROLLING_WINDOW}-reading average and readings far from your usual level")
+
+    # The date range is pushed down to storage, so only the selected days are read
+    version = get_data_version(username)
+    with span("visualization.load") as timing:
+        filtered_df, notes = load_data_with_notes(username, start_date, end_date)
+        timing.rows = len(filtered_df)
+
+    if filtered_df.empty:
+        st.warning("No data available for the selected date range.")
+        return
+
+    st.subheader("Trends Over Time")
+
+    with span("visualization.figures", rows=len(filtered_df)):
+        figures = get_trend_figures(username, version, start_date, end_date, filtered_df, overlays)
+
+    # Sending the figures includes serializing them to JSON
+    with span("visualization.plotly_chart"):
         # Blood Pressure
         st.write("#### Blood Pressure")
-        bp_df = filtered_df.copy()
-        
-        # Ensure 'blood_pressure' column is string type and handle potential non-string entries
-        bp_df['blood_pressure'] = bp_df['blood_pressure'].astype(str)
-        
-        # Use a regex to split only valid blood pressure strings (e.g., "120/80")
-        # Non-matching entries will result in NaN for systolic and diastolic
-        bp_split = bp_df['blood_pressure'].str.extract(r'(\d+)/(\d+)', expand=True)
-        bp_df['systolic'] = pd.to_numeric(bp_split[0], errors='coerce')
-        bp_df['diastolic'] = pd.to_numeric(bp_split[1], errors='coerce')
-        
-        # Drop rows where both systolic and diastolic are NaN, as they can't be plotted
-        bp_plot_df = bp_df.dropna(subset=['systolic', 'diastolic'])
-
-        if not bp_plot_df.empty:
-            fig_bp = px.line(bp_plot_df, x='date', y=['systolic', 'diastolic'], title='Blood Pressure Trend')
-            st.plotly_chart(fig_bp, use_container_width=True)
+        if figures['blood_pressure'] is not None:
+            st.plotly_chart(figures['blood_pressure'], use_container_width=True)
         else:
             st.info("No valid blood pressure data to display for the selected period.")
 
         # Sugar Level
         st.write("#### Sugar Level")
-        fig_sugar = px.line(filtered_df, x='date', y='sugar_level', title='Sugar Level Trend')
-        st.plotly_chart(fig_sugar, use_container_width=True)
+        st.plotly_chart(figures['sugar_level'], use_container_width=True)
 
         # Pulse Rate
         st.write("#### Pulse Rate")
-        fig_pulse = px.line(filtered_df, x='date', y='pulse_rate', title='Pulse Rate Trend')
-        st.plotly_chart(fig_pulse, use_container_width=True)
+        st.plotly_chart(figures['pulse_rate'], use_container_width=True)
 
-        st.subheader("Raw Data")
-        st.dataframe(filtered_df)
+    st.subheader("Raw Data")
+    with span("visualization.raw_data", rows=len(filtered_df)):
+        render_raw_data(filtered_df, notes)
+
+def render_visualization():
+    st.header("Health Data Visualization")
+
+    username = st.session_state["username"]
+    date_bounds = get_date_bounds(username)
+
+    if date_bounds is not None:
+        render_filtered_trends(username, date_bounds)
+    else:
+        st.info("No data available for visualization. Please add some health records first.")
@@ -2,24 +2,30 @@ import streamlit as st
 import streamlit_authenticator as stauth
 import yaml
 from yaml.loader import SafeLoader
+from features.credentials.credentials import get_credential_store, use_credential_store
+from features.telemetry.telemetry import configure_telemetry
+from features.thresholds.thresholds import configure_thresholds
+from features.ui.ui import render_page, render_ui
 
-with open('./config.yaml') as file:
-    config = yaml.load(file, Loader=SafeLoader)
+@st.cache_resource
+def load_config():
+    # Parsed once per server process; the app never writes config.yaml
+    with open('./config.yaml') as file:
+        return yaml.load(file, Loader=SafeLoader)
+
+config = load_config()
+
+configure_thresholds(config.get('healthy_ranges'))
+configure_telemetry(config.get('telemetry'))
 
 authenticator = stauth.Authenticate(
-    config['credentials'],
+    {'usernames': {}},
     config['cookie']['name'],
     config['cookie']['key'],
     config['cookie']['expiry_days']
 )
-
-from features.input_form.input_form import render_input_form
-from features.visualization.visualization import render_visualization
-from features.analytics.analytics import render_analytics
-from features.reports.reports import render_reports
-from features.recommendations.recommendations import render_recommendations
-from features.introduction.introduction import render_introduction
-from features.ui.ui import render_ui
+# Accounts live in the SQLite credential store; see features/credentials
+use_credential_store(authenticator, get_credential_store(config['credentials'].get('usernames'), config.get('credential_store')))
 
 def main():
     # Initialize session state variables if they don't exist
@@ -48,21 +54,14 @@ def main():
         authenticator.logout('Logout', 'main')
         st.write(f'Welcome *{st.session_state["name"]}*') # Access name from session_state
         
+        # Storage brings in pandas, so it is set up only once a page is shown
+        from features.storage.storage import configure_storage
+        configure_storage(config.get('storage'))
+
         # Original main content goes here
         page = render_ui()
-
-        if page == "Introduction":
-            render_introduction()
-        elif page == "Input Form":
-            render_input_form()
-        elif page == "Visualization":
-            render_visualization()
-        elif page == "Analytics":
-            render_analytics()
-        elif page == "Reports":
-            render_reports()
-        elif page == "Recommendations":
-            render_recommendations()
+        # Page modules are imported on first use; see PAGES in features/ui/ui.py
+        render_page(page)
 
     elif st.session_state["authentication_status"] == False: # Access status directly
         st.error('Username/password is incorrect')
@@ -83,13 +82,7 @@ def main():
                                 st.session_state["username"] = username_of_registered_user
                                 # Reset registration_successful flag (no longer needed for this flow)
                                 st.session_state["registration_successful"] = False 
-                                # Save the updated config to the YAML file
-                                # Remove 'logged_in' status before saving to prevent persistent login
-                                for username_key in config['credentials']['usernames']:
-                                    if 'logged_in' in config['credentials']['usernames'][username_key]:
-                                        del config['credentials']['usernames'][username_key]['logged_in']
-                                with open('./config.yaml', 'w') as file:
-                                    yaml.dump(config, file, default_flow_style=False)
+                                # The new account was already saved by the credential store
                                 st.rerun() # Force rerun to display app content
         except Exception as e:
             st.error(e)
@@ -0,0 +1,104 @@
+import random
+import re
+
+import numpy as np
+import pandas as pd
+
+from features.recommendations.recommendations import generate_daily_recommendations
+from features.storage.records import backfill_blood_pressure
+
+# generate_daily_recommendations must give exactly the text of the row-wise
+# rule it replaced, kept here as it was
+
+def generate_daily_recommendation(row):
+    recs = []
+
+    # Blood Pressure
+    bp = row['blood_pressure']
+    if isinstance(bp, str):
+        match = re.match(r'(\d+)/(\d+)', bp)
+        if match:
+            systolic, diastolic = int(match.group(1)), int(match.group(2))
+            bp_val = f"{systolic}/{diastolic} mmHg"
+            if systolic > 130 or diastolic > 85:
+                recs.append(f"BP ({bp_val}) is high.")
+            elif systolic < 90 or diastolic < 60:
+                recs.append(f"BP ({bp_val}) is low.")
+            else:
+                recs.append(f"BP ({bp_val}) is healthy.")
+        else:
+            recs.append("BP data format invalid.")
+    else:
+        recs.append("BP data missing.")
+
+    # Sugar Level
+    sugar = row['sugar_level']
+    if pd.notna(sugar):
+        sugar_val = f"{sugar:.0f} mg/dL"
+        if sugar > 140:
+            recs.append(f"Sugar ({sugar_val}) is high.")
+        elif sugar < 70:
+            recs.append(f"Sugar ({sugar_val}) is low.")
+        else:
+            recs.append(f"Sugar ({sugar_val}) is healthy.")
+    else:
+        recs.append("Sugar data missing.")
+
+    # Pulse Rate
+    pulse = row['pulse_rate']
+    if pd.notna(pulse):
+        pulse_val = f"{pulse:.0f} bpm"
+        if pulse > 100:
+            recs.append(f"Pulse ({pulse_val}) is high.")
+        elif pulse < 60:
+            recs.append(f"Pulse ({pulse_val}) is low.")
+        else:
+            recs.append(f"Pulse ({pulse_val}) is healthy.")
+    else:
+        recs.append("Pulse data missing.")
+
+    if all("healthy" in rec.lower() for rec in recs if "data missing" not in rec.lower() and "data format invalid" not in rec.lower()):
+        return "All recorded metrics are within the healthy range. Keep it up!"
+
+    return " ".join(recs)
+
+def _random_blood_pressure(rng):
+    systolic, diastolic = rng.randint(70, 190), rng.randint(40, 120)
+    return rng.choice([
+        f"{systolic}/{diastolic}",
+        f"{systolic}/{diastolic}",
+        f" {systolic}/{diastolic}",
+        f"{systolic}/{diastolic} ",
+        f"x{systolic}/{diastolic}",
+        f"{systolic}.5/{diastolic}",
+        f"{systolic}/{diastolic}.5",
+        f"{systolic}/{diastolic}/{systolic}",
+        f"{systolic} / {diastolic}",
+        f"{systolic}-{diastolic}",
+        f"{systolic}/",
+        f"/{diastolic}",
+        f"{systolic}",
+        "",
+        "n/a",
+        None,
+    ])
+
+def _random_reading(rng, low, high):
+    return rng.choice([rng.randint(low, high), rng.randint(low, high), rng.uniform(low, high), np.nan])
+
+def test_daily_recommendations_match_the_row_rule():
+    rng = random.Random(0)
+    df = pd.DataFrame({
+        'blood_pressure': [_random_blood_pressure(rng) for _ in range(5000)],
+        'sugar_level': [_random_reading(rng, 40, 250) for _ in range(5000)],
+        'pulse_rate': [_random_reading(rng, 35, 140) for _ in range(5000)],
+    })
+    # The numbers are parsed from the text, as for records saved before
+    # systolic and diastolic were stored
+    df['systolic'], df['diastolic'] = backfill_blood_pressure(df)
+
+    expected = [generate_daily_recommendation(row) for _, row in df.iterrows()]
+    assert generate_daily_recommendations(df).tolist() == expected
+    # load_data holds blood_pressure as a categorical
+    categorical = df.astype({'blood_pressure': 'category'})
+    assert generate_daily_recommendations(categorical).tolist() == expected